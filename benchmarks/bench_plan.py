@@ -0,0 +1,107 @@
+"""Micro-benchmark for the per call overhead of the resource methods.
+
+Compares the methods of a resource, that use the MethodPlan compiled by
+add_resource, with calls on the plain schema method infos, that have to
+prepare the plan for every request. The HTTP session is replaced by a stub,
+so only the client side work is measured.
+
+    python -m benchmarks.bench_plan [calls]
+"""
+import sys
+import timeit
+
+from gl2api import get_api, StreamSchema, StreamRuleSchema, StreamRule
+
+
+class StubResponse(object):
+
+    def __init__(self, status_code, data):
+        self.status_code=status_code
+        self.data=data
+        self.headers={}
+        self.text=''
+
+    def json(self):
+        return self.data
+
+
+class StubSession(object):
+    """Session replacement, that answers every request with a canned response."""
+
+    def __init__(self, responses):
+        self.responses=responses
+
+    def _respond(self, method, url):
+        path=url.split('?')[0]
+        for (key, response) in self.responses.items():
+            if method==key[0] and path.endswith(key[1]):
+                return response
+        raise KeyError(url)
+
+    def get(self, url, **kwargs):
+        return self._respond('GET', url)
+
+    def put(self, url, **kwargs):
+        return self._respond('PUT', url)
+
+    def post(self, url, **kwargs):
+        return self._respond('POST', url)
+
+    def delete(self, url, **kwargs):
+        return self._respond('DELETE', url)
+
+
+STREAM={
+    "id": "5b070a87e64ada000110ac23", "title": "Stream", "description": "bench", "disabled": False,
+    "index_set_id": "5abe920408813b00011123a1", "matching_type": "AND", "remove_matches_from_default_stream": False,
+    "rules": [], "alert_conditions": [], "outputs": [], "content_pack": None, "is_default": False,
+    "creator_user_id": "admin", "created_at": "2018-05-24T16:12:55.137Z"
+}
+RULE={"id": "5b070a87e64ada000110ac24", "stream_id": STREAM["id"], "description": "rule", "field": "source",
+      "type": 1, "inverted": False, "value": "x"}
+
+
+def make_api():
+    api=get_api("http://localhost:9000/api")
+    api.session=StubSession({
+        ('GET', 'streams'): StubResponse(200, {"streams": [STREAM]*10, "total": 10}),
+        ('GET', 'rules/'+RULE['id']): StubResponse(200, RULE),
+        ('PUT', 'rules/'+RULE['id']): StubResponse(200, {}),
+        ('DELETE', 'rules/'+RULE['id']): StubResponse(204, None),
+    })
+    return api
+
+
+def changed(obj):
+    """Mark the value of the rule as changed, the update of an unchanged object isn't sent."""
+    obj.value=obj.value
+    return obj
+
+
+def run(calls):
+    api=make_api()
+    rule=StreamRule(**RULE)
+    cases=[
+        ('list', 
+         lambda: api.streams.list(),
+         lambda: api._get(StreamSchema, StreamSchema._methods['list'])),
+        ('get', 
+         lambda: api.stream_rules.get(stream_id=RULE['stream_id'], id=RULE['id']),
+         lambda: api._get(StreamRuleSchema, StreamRuleSchema._methods['get'], 
+                          stream_id=RULE['stream_id'], id=RULE['id'])),
+        ('update', 
+         lambda: api.stream_rules.update(changed(rule)),
+         lambda: api._put_post(changed(rule), StreamRuleSchema, StreamRuleSchema._methods['update'], is_post=False)),
+        ('delete', 
+         lambda: api.stream_rules.delete(rule),
+         lambda: api._delete(rule, StreamRuleSchema, StreamRuleSchema._methods['delete'])),
+    ]
+    for (name, compiled, uncompiled) in cases:
+        t_compiled=min(timeit.repeat(compiled, number=calls, repeat=3))
+        t_uncompiled=min(timeit.repeat(uncompiled, number=calls, repeat=3))
+        print("{:8s} compiled {:8.1f}us/call  uncompiled {:8.1f}us/call  speedup {:5.2f}x".format(
+            name, t_compiled/calls*1e6, t_uncompiled/calls*1e6, t_uncompiled/t_compiled))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv)>1 else 2000)
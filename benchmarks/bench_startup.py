@@ -0,0 +1,49 @@
+"""Benchmark for the cold start of short lived scripts.
+
+Every sample runs in a new interpreter, that imports gl2api, creates the API
+and accesses one resource, like a cron job that only works with streams.
+The resources are added either lazily on first access or all at creation:
+
+    python benchmarks/bench_startup.py [runs]
+"""
+import subprocess
+import sys
+
+SCRIPT="""
+import time
+start=time.time()
+import requests, marshmallow
+deps=time.time()
+import gl2api
+imported=time.time()
+api=gl2api.create_api("http://localhost:9000/api", lazy={lazy})
+created=time.time()
+api.streams.list
+accessed=time.time()
+print("%f %f %f %f" % (deps-start, imported-deps, created-imported, accessed-created))
+"""
+
+STEPS=('dependencies', 'import gl2api', 'create_api', 'first resource')
+
+
+def sample(lazy):
+    out=subprocess.check_output([sys.executable, '-c', SCRIPT.format(lazy=lazy)])
+    return [float(v) for v in out.split()]
+
+
+def median(values):
+    values=sorted(values)
+    return values[len(values)//2]
+
+
+def run(runs):
+    for lazy in (False, True):
+        samples=[sample(lazy) for i in range(runs)]
+        steps=[median([s[i] for s in samples]) for i in range(len(STEPS))]
+        print("lazy={:5s} ".format(str(lazy))+"  ".join(
+            "{} {:6.1f}ms".format(name, t*1000) for (name, t) in zip(STEPS, steps)) +
+            "  total gl2api {:6.1f}ms".format(sum(steps[1:])*1000))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv)>1 else 20)
@@ -0,0 +1,277 @@
+"""Local stand-in for the Graylog REST API.
+
+The server keeps the fixtures in memory and supports the list/get/add/update/
+delete calls of the gl2api resources and the universal searches, so the
+client can be benchmarked without a Graylog installation.
+
+    server=FakeGraylog(inputs=50, streams=100).start()
+    api=get_api(server.url)
+    ...
+    server.stop()
+"""
+import json
+import re
+import threading
+import uuid
+import urllib
+import zlib
+import urlparse
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+from datetime import datetime
+
+from gl2api.util import parse_timestamp, gzip_bytes
+
+from . import fixtures
+
+# the messages of the searches are spread evenly over this day
+DAY_START=datetime(2018, 7, 1)
+DAY_MS=24*3600*1000
+# responses of at least this size are compressed for clients that accept gzip
+GZIP_MIN_SIZE=1024
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads=True
+    request_queue_size=128
+    allow_reuse_address=True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version="HTTP/1.1"
+    # avoid delayed ACK stalls on keep-alive connections
+    disable_nagle_algorithm=True
+    wbufsize=-1
+
+    def log_message(self, *args):
+        pass
+
+    def _dispatch(self):
+        url=urlparse.urlparse(self.path)
+        length=int(self.headers.get('Content-Length') or 0)
+        body=self.rfile.read(length) if length else None
+        if body is not None and self.headers.get('Content-Encoding')=='gzip':
+            body=zlib.decompress(body, 16+zlib.MAX_WBITS)
+        body=json.loads(body) if body is not None else None
+        query=dict(urlparse.parse_qsl(url.query))
+        status, data=self.server.graylog.handle(self.command, urllib.unquote(url.path), query, body)
+
+        # search pages are returned pre-encoded
+        payload=data if isinstance(data, str) else json.dumps(data) if data is not None else ''
+        gzipped=len(payload)>=GZIP_MIN_SIZE and 'gzip' in (self.headers.get('Accept-Encoding') or '')
+        if gzipped:
+            payload=self.server.graylog.gzip(payload, keep=isinstance(data, str))
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET=do_POST=do_PUT=do_DELETE=_dispatch
+
+
+class FakeGraylog(object):
+    """In memory Graylog, that serves the REST API under http://127.0.0.1:<port>/api."""
+
+    def __init__(self, inputs=20, extractors=10, streams=50, rules=5, index_sets=5, roles=20,
+                 search_total=100000, port=0, is_master=True):
+        self.search_total=search_total
+        self.is_master=is_master
+        self.port=port
+        self.lock=threading.Lock()
+        self.input_types=fixtures.input_types()
+        self.strategies={kind: fixtures.strategies(kind) for kind in ('rotation', 'retention')}
+        self.stream_rule_types=fixtures.stream_rule_types()
+        self.ldap=fixtures.ldap_settings()
+        self.index_sets={s['id']: s for s in (fixtures.index_set(i) for i in range(index_sets))}
+        self.roles={r['name']: r for r in (fixtures.role(i) for i in range(roles))}
+        self.inputs={}
+        self.extractors={}
+        for i in range(inputs):
+            inp=fixtures.input(i)
+            self.inputs[inp['id']]=inp
+            self.extractors[inp['id']]={
+                e['id']: e for e in (fixtures.extractor(i*extractors+j) for j in range(extractors))}
+        self.streams={}
+        self.rules={}
+        for i in range(streams):
+            stream=fixtures.stream(i, rules)
+            self.streams[stream['id']]=stream
+            self.rules[stream['id']]={r['id']: r for r in stream['rules']}
+        self._routes=self._make_routes()
+        self._pages={}
+        self._gzipped={}
+        self._server=None
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}/api".format(self.port)
+
+    def start(self):
+        self._server=_Server(('127.0.0.1', self.port), _Handler)
+        self._server.graylog=self
+        self.port=self._server.server_address[1]
+        thread=threading.Thread(target=self._server.serve_forever)
+        thread.daemon=True
+        thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server=None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _make_routes(self):
+        id_='(?P<id>[^/]+)'
+        return [(re.compile('^/api/'+path+'$'), handlers) for (path, handlers) in [
+            ('system', {'GET': lambda m, q, b: (200, {"is_master": self.is_master, "lifecycle": "running",
+                                                       "version": "2.4.6+ceaa7e4"})}),
+            ('system/lbstatus', {'GET': lambda m, q, b: (200, "ALIVE")}),
+            ('system/inputs/types/all', {'GET': lambda m, q, b: (200, self.input_types)}),
+            ('system/indices/rotation/strategies',
+                {'GET': lambda m, q, b: (200, self._envelope('strategies', self.strategies['rotation']))}),
+            ('system/indices/retention/strategies',
+                {'GET': lambda m, q, b: (200, self._envelope('strategies', self.strategies['retention']))}),
+            ('system/inputs', self._collection(lambda m: self.inputs, 'inputs', 'id')),
+            ('system/inputs/'+id_, self._element(lambda m: self.inputs)),
+            ('system/inputs/(?P<input_id>[^/]+)/extractors',
+                self._collection(self._children(self.extractors, 'input_id'), 'extractors', 'extractor_id',
+                                 convert=self._extractor_request)),
+            ('system/inputs/(?P<input_id>[^/]+)/extractors/'+id_,
+                self._element(self._children(self.extractors, 'input_id'), 'extractor_id',
+                              convert=self._extractor_request)),
+            ('system/indices/index_sets', self._collection(lambda m: self.index_sets, 'index_sets', 'id', True)),
+            ('system/indices/index_sets/'+id_, self._element(lambda m: self.index_sets, full=True)),
+            ('system/indices/index_sets/'+id_+'/default', {'PUT': self._set_default_index_set}),
+            ('system/ldap/settings', {'GET': lambda m, q, b: (200, self.ldap),
+                                      'PUT': lambda m, q, b: (204, None),
+                                      'DELETE': lambda m, q, b: (204, None)}),
+            ('streams', self._collection(lambda m: self.streams, 'streams', 'stream_id')),
+            ('streams/'+id_, self._element(lambda m: self.streams)),
+            ('streams/(?P<stream_id>[^/]+)/rules/types', {'GET': lambda m, q, b: (200, self.stream_rule_types)}),
+            ('streams/(?P<stream_id>[^/]+)/rules',
+                self._collection(self._children(self.rules, 'stream_id'), 'stream_rules', 'streamrule_id')),
+            ('streams/(?P<stream_id>[^/]+)/rules/'+id_,
+                self._element(self._children(self.rules, 'stream_id'), 'streamrule_id')),
+            ('roles', self._collection(lambda m: self.roles, 'roles', 'name', True, key='name')),
+            ('roles/(?P<id>[^/]+)', self._element(lambda m: self.roles, full=True)),
+            ('search/universal/(relative|absolute)', {'GET': self._search}),
+        ]]
+
+    @staticmethod
+    def _children(stores, group):
+        """Store of the children of the parent in the path, also for parents added later."""
+        return lambda m: stores.setdefault(m.group(group), {})
+
+    def _set_default_index_set(self, m, q, b):
+        with self.lock:
+            if m.group('id') not in self.index_sets:
+                return (404, {"type": "ApiError", "message": "Not found"})
+            for (id_, index_set) in self.index_sets.items():
+                index_set['default']=id_==m.group('id')
+        return (200, self.index_sets[m.group('id')])
+
+    @staticmethod
+    def _extractor_request(body):
+        """Extractors are written with a map of converters, but listed with a list of them."""
+        body=dict(body)
+        if isinstance(body.get('converters'), dict):
+            body['converters']=[{"type": k, "config": v} for (k, v) in body['converters'].items()]
+        return body
+
+    @staticmethod
+    def _envelope(field, items):
+        return {field: items, "total": len(items)}
+
+    def _collection(self, store, field, id_field, full=False, key='id', convert=dict):
+        def list_(m, q, b):
+            return (200, self._envelope(field, store(m).values()))
+
+        def add(m, q, b):
+            with self.lock:
+                obj=convert(b)
+                obj.setdefault(key, uuid.uuid4().hex[:24])
+                # parents ids like the stream_id of rules
+                for (k, v) in m.groupdict().items():
+                    obj.setdefault(k, v)
+                store(m)[obj[key]]=obj
+            return (201, obj if full else {id_field: obj[key]})
+
+        return {'GET': list_, 'POST': add}
+
+    def _element(self, store, id_field='id', full=False, convert=dict):
+        def get(m, q, b):
+            obj=store(m).get(m.group('id'))
+            return (200, obj) if obj is not None else (404, {"type": "ApiError", "message": "Not found"})
+
+        def update(m, q, b):
+            with self.lock:
+                objs=store(m)
+                if m.group('id') not in objs:
+                    return (404, {"type": "ApiError", "message": "Not found"})
+                objs[m.group('id')].update(convert(b))
+            return (200, objs[m.group('id')] if full else {id_field: m.group('id')})
+
+        def delete(m, q, b):
+            with self.lock:
+                return (204, None) if store(m).pop(m.group('id'), None) is not None else (404, None)
+
+        return {'GET': get, 'PUT': update, 'DELETE': delete}
+
+    def gzip(self, payload, keep=False):
+        """Compress the payload, with <keep> the result is kept like the pre-encoded search pages."""
+        if not keep:
+            return gzip_bytes(payload, 1)
+        if payload not in self._gzipped:
+            self._gzipped[payload]=gzip_bytes(payload, 1)
+        return self._gzipped[payload]
+
+    def _search_range(self, q):
+        """Return the first message and the number of messages of the day 2018-07-01 in [from, to].
+
+        Like Graylog, the range includes the messages at both ends.
+        """
+        interval=DAY_MS//self.search_total
+
+        def ms(name):
+            return int(round((parse_timestamp(q[name])-DAY_START).total_seconds()*1000))
+
+        first=min(self.search_total, max(0, -(-ms('from')//interval))) if 'from' in q else 0
+        end=min(self.search_total, max(0, ms('to')//interval+1)) if 'to' in q else self.search_total
+        return (first, max(0, end-first))
+
+    def _search(self, m, q, b):
+        (first, total)=self._search_range(q)
+        key=(int(q.get('offset', 0)), int(q.get('limit', 150)), q.get('query', '*'), first, total,
+             q.get('sort')=='timestamp:desc', q.get('fields'))
+        if key not in self._pages:
+            page=fixtures.search_page(key[0], key[1], total, key[2], first, DAY_MS//self.search_total, key[5])
+            if key[6]:
+                fields=key[6].split(',')
+                page['fields']=fields
+                for hit in page['messages']:
+                    hit['message']={k: v for (k, v) in hit['message'].items() if k in fields}
+            self._pages[key]=json.dumps(page)
+        return (200, self._pages[key])
+
+    def handle(self, method, path, query, body):
+        for (pattern, handlers) in self._routes:
+            m=pattern.match(path)
+            if m is not None:
+                if method not in handlers:
+                    return (405, {"type": "ApiError", "message": "Method not allowed"})
+                try:
+                    return handlers[method](m, query, body)
+                except KeyError:
+                    return (404, {"type": "ApiError", "message": "Not found"})
+        return (404, {"type": "ApiError", "message": "Unknown path {}".format(path)})
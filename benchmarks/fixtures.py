@@ -0,0 +1,153 @@
+"""Canned Graylog REST data for the fake server.
+
+All data is generated deterministically, so benchmark runs are comparable.
+"""
+import random
+
+
+def _id(prefix, i):
+    return "{}{:020x}".format(prefix, i)[:24]
+
+
+def input_types():
+    return {
+        "org.graylog2.inputs.{}".format(name): {
+            "type": "org.graylog2.inputs.{}".format(name),
+            "name": name,
+            "link_to_docs": "http://docs.graylog.org/",
+            "is_exclusive": False,
+            "requested_configuration": {
+                "port": {"type": "number", "default_value": 12201, "human_name": "Port", "is_optional": False,
+                         "description": "Port to listen on", "attributes": [], "additional_info": {}},
+                "bind_address": {"type": "text", "default_value": "0.0.0.0", "human_name": "Bind address",
+                                 "is_optional": False, "description": "Address to listen on", "attributes": [],
+                                 "additional_info": {}},
+            }
+        }
+        for name in ("gelf.udp.GELFUDPInput", "gelf.tcp.GELFTCPInput", "syslog.udp.SyslogUDPInput",
+                     "syslog.tcp.SyslogTCPInput", "beats.BeatsInput", "raw.udp.RawUDPInput")
+    }
+
+
+def strategies(kind):
+    return [
+        {
+            "type": "org.graylog2.indexer.{}.strategies.{}".format(kind, name),
+            "default_config": {"type": name, "max_number_of_indices": 20},
+            "json_schema": {"type": "object", "id": name, "properties": {
+                "max_number_of_indices": {"type": "integer"}, "type": {"type": "string"}}}
+        }
+        for name in ("CountBased", "SizeBased", "TimeBased")
+    ]
+
+
+def index_set(i):
+    return {
+        "id": _id("is", i), "title": "Index set {}".format(i), "description": "Index set {}".format(i),
+        "index_prefix": "graylog_{}".format(i), "shards": 4, "replicas": 0,
+        "rotation_strategy_class": "org.graylog2.indexer.rotation.strategies.MessageCountRotationStrategy",
+        "rotation_strategy": {"type": "org.graylog2.indexer.rotation.strategies.MessageCountRotationStrategyConfig",
+                              "max_docs_per_index": 20000000},
+        "retention_strategy_class": "org.graylog2.indexer.retention.strategies.DeletionRetentionStrategy",
+        "retention_strategy": {"type": "org.graylog2.indexer.retention.strategies.DeletionRetentionStrategyConfig",
+                               "max_number_of_indices": 20},
+        "creation_date": "2018-03-30T19:38:12.283Z", "index_analyzer": "standard",
+        "index_optimization_max_num_segments": 1, "index_optimization_disabled": False,
+        "writable": True, "default": i==0
+    }
+
+
+def stream_rule(stream_id, i):
+    return {"id": _id("sr", i), "stream_id": stream_id, "description": "rule {}".format(i),
+            "field": "source", "type": 1, "inverted": False, "value": "host-{}".format(i)}
+
+
+def stream(i, rules=5):
+    stream_id=_id("st", i)
+    return {
+        "id": stream_id, "title": "Stream {}".format(i), "description": "Stream {}".format(i),
+        "creator_user_id": "admin", "outputs": [], "matching_type": "AND", "disabled": False,
+        "created_at": "2018-05-24T16:12:55.137Z", "content_pack": None,
+        "rules": [stream_rule(stream_id, i*100+j) for j in range(rules)],
+        "alert_conditions": [], "alert_receivers": {"emails": [], "users": []},
+        "remove_matches_from_default_stream": False, "index_set_id": _id("is", 0), "is_default": False
+    }
+
+
+def stream_rule_types():
+    return [{"id": i, "name": name, "short_desc": name, "long_desc": "match {}".format(name)}
+            for (i, name) in enumerate(("EXACT", "REGEX", "GREATER", "SMALLER", "PRESENCE", "CONTAINS"), 1)]
+
+
+def input(i):
+    return {
+        "id": _id("in", i), "title": "Input {}".format(i), "global": True, "name": "GELF UDP",
+        "content_pack": None, "created_at": "2018-03-30T19:38:12.283Z",
+        "type": "org.graylog2.inputs.gelf.udp.GELFUDPInput", "creator_user_id": "admin", "node": None,
+        "attributes": {"port": 12201+i, "bind_address": "0.0.0.0", "recv_buffer_size": 262144},
+        "configuration": {"port": 12201+i, "bind_address": "0.0.0.0", "recv_buffer_size": 262144}
+    }
+
+
+def extractor(i):
+    return {
+        "id": _id("ex", i), "title": "Extractor {}".format(i), "type": "regex", "converters": [],
+        "order": i, "cursor_strategy": "copy", "source_field": "message", "target_field": "field_{}".format(i),
+        "extractor_config": {"regex_value": "^(\\\\S+) "}, "creator_user_id": "admin",
+        "condition_type": "none", "condition_value": "", "converter_exceptions": 0, "metrics": {}
+    }
+
+
+def role(i):
+    return {"name": "Role {}".format(i), "description": "Role {}".format(i),
+            "permissions": ["streams:read:{}".format(_id("st", j)) for j in range(10)], "read_only": False}
+
+
+def ldap_settings():
+    return {"enabled": False, "system_username": "", "system_password": "", "ldap_uri": "ldap://localhost:389/",
+            "use_start_tls": False, "trust_all_certificates": False, "active_directory": False,
+            "search_base": "", "search_pattern": "", "default_group": "Reader", "group_mapping": {},
+            "group_search_base": None, "group_id_attribute": None, "group_search_pattern": None,
+            "display_name_attribute": "cn", "additional_default_groups": []}
+
+
+MESSAGE_FIELDS=["timestamp", "source", "level", "message", "facility", "application", "pid", "took_ms"]
+
+
+def search_page(offset, limit, total, query="*", first=0, interval_ms=1, descending=False):
+    """One page of a universal search with min(limit, total-offset) messages.
+
+    The hits are the messages first, first+1, ... of the day, message i has
+    the timestamp i*interval_ms milliseconds after midnight.
+    """
+    rnd=random.Random(offset)
+    count=max(0, min(limit, total-offset))
+    messages=[]
+    indices=range(first+offset, first+offset+count) if not descending else \
+        range(first+total-1-offset, first+total-1-offset-count, -1)
+    for i in indices:
+        ms=i*interval_ms
+        messages.append({
+            "index": "graylog_0",
+            "highlight_ranges": {},
+            "message": {
+                "_id": _id("ms", i),
+                "timestamp": "2018-07-01T{:02d}:{:02d}:{:02d}.{:03d}Z".format(
+                    (ms//3600000) % 24, (ms//60000) % 60, (ms//1000) % 60, ms % 1000),
+                "source": "host-{}".format(rnd.randint(0, 50)),
+                "level": rnd.randint(0, 7),
+                "message": "request {} handled in {} ms".format(i, rnd.randint(1, 500)),
+                "facility": "app",
+                "application": "service-{}".format(rnd.randint(0, 10)),
+                "pid": rnd.randint(1000, 2000),
+                "took_ms": rnd.random()*500,
+                "streams": [_id("st", 0)],
+                "gl2_source_input": _id("in", 0),
+                "gl2_source_node": "5b2ad96e-5b3c-4c9b-bc5a-c6b8fd2b32c0",
+            }
+        })
+    return {
+        "query": query, "built_query": "{}", "used_indices": [], "messages": messages,
+        "fields": MESSAGE_FIELDS, "time": 12, "total_results": total,
+        "from": "2018-07-01T00:00:00.000Z", "to": "2018-07-02T00:00:00.000Z", "decoration_stats": None
+    }
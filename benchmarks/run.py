@@ -0,0 +1,206 @@
+"""Benchmark suite for the gl2api client against the local fake Graylog.
+
+Every scenario calls one resource method <calls> times and records the
+throughput, the latency percentiles and the peak memory. The results are
+written as JSON, so runs can be compared over time:
+
+    python -m benchmarks.run --calls 200 --output bench.json
+    python -m benchmarks.run --scenario search_list_1000
+
+The peak memory is measured with tracemalloc where available. Otherwise every
+scenario runs in a new interpreter (forced with --isolate), which reports its
+max. resident set size and how much it grew during the measured calls; in a
+single process the max. RSS of earlier scenarios would hide later ones.
+"""
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from gl2api import API, InputSchema, InputTypeSchema, IndexRetentionSchema, IndexRotationSchema, \
+    IndexSetSchema, StreamSchema, StreamRuleTypeShema, StreamRuleSchema, RoleSchema, ExtractorSchema, \
+    AbsoluteSearchSchema, StreamRule
+
+from .fake_server import FakeGraylog
+
+try:
+    import tracemalloc
+except ImportError:     # pragma: no cover
+    tracemalloc=None
+try:
+    import resource
+except ImportError:     # pragma: no cover
+    resource=None
+
+SEARCH_SIZES=(100, 1000, 10000)
+
+
+def make_api(url):
+    api=API(url, timeout=30)
+    for (name, schema) in [('inputs', InputSchema), ('input_types', InputTypeSchema),
+                           ('index_retention_strategies', IndexRetentionSchema),
+                           ('index_rotation_strategies', IndexRotationSchema), ('index_sets', IndexSetSchema),
+                           ('streams', StreamSchema), ('stream_rule_types', StreamRuleTypeShema),
+                           ('stream_rules', StreamRuleSchema), ('roles', RoleSchema),
+                           ('extractors', ExtractorSchema), ('absolute_search', AbsoluteSearchSchema)]:
+        api.add_resource(name=name, schema=schema)
+    return api
+
+
+def scenarios(api, server):
+    """Return (name, method type, setup) tuples, setup(calls) returns the function to benchmark."""
+    stream_id=sorted(server.streams.keys())[0]
+    input_id=sorted(server.inputs.keys())[0]
+    rule=StreamRule(stream_id=stream_id, description="bench", _type=1, field="source", value="x", inverted=False)
+
+    def delete_rules(calls):
+        rules=iter([api.stream_rules.add(rule) for i in range(calls+1)])
+        return lambda: api.stream_rules.delete(next(rules))
+
+    def update_rule(calls):
+        obj=api.stream_rules.add(rule)
+
+        def update():
+            # the update of an unchanged object isn't sent
+            obj.value=obj.value
+            return api.stream_rules.update(obj)
+        return update
+
+    def call(m, **kwargs):
+        return lambda calls: lambda: m(**kwargs)
+
+    ret=[
+        ('input_types_list', 'GET dict', call(api.input_types.list)),
+        ('stream_rule_types_list', 'GET list', call(api.stream_rule_types.list, stream_id=stream_id)),
+        ('streams_list', 'GET field', call(api.streams.list)),
+        ('streams_list_lazy', 'GET field lazy', call(api.streams.list, lazy=True)),
+        ('inputs_list', 'GET field', call(api.inputs.list)),
+        ('extractors_list', 'GET field', call(api.extractors.list, input_id=input_id)),
+        ('index_sets_list', 'GET field', call(api.index_sets.list)),
+        ('roles_list', 'GET field', call(api.roles.list)),
+        ('stream_get', 'GET', call(api.streams.get, id=stream_id)),
+        ('stream_rule_add', 'POST', lambda calls: lambda: api.stream_rules.add(rule)),
+        ('stream_rule_update', 'PUT', update_rule),
+        ('stream_rule_delete', 'DELETE', delete_rules),
+    ]
+    for size in SEARCH_SIZES:
+        params={'query': '*', 'from': '2018-07-01T00:00:00.000Z', 'to': '2018-07-02T00:00:00.000Z', 'limit': size}
+        ret.append(('search_list_{}'.format(size), 'GET search',
+                    lambda calls, params=params: lambda: api.absolute_search.list(query_params=dict(params))))
+        ret.append(('search_list_{}_fields'.format(size), 'GET search fields',
+                    lambda calls, params=params: lambda: api.absolute_search.list(
+                        query_params=dict(params), fields=['timestamp', 'source', 'level'])))
+    return ret
+
+
+def percentile(values, p):
+    values=sorted(values)
+    k=(len(values)-1)*p/100.0
+    lower=int(k)
+    upper=min(lower+1, len(values)-1)
+    return values[lower]+(values[upper]-values[lower])*(k-lower)
+
+
+def _max_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource is not None else None
+
+
+def peak_memory_start():
+    """Start the measurement, returns the max. RSS so far."""
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+    return _max_rss()
+
+
+def peak_memory_stop(rss_start):
+    if tracemalloc is not None:
+        peak=tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return {'peak_traced_kb': peak//1024}
+    elif resource is not None:
+        rss=_max_rss()
+        return {'max_rss_kb': rss, 'max_rss_growth_kb': rss-rss_start}
+    return {}
+
+
+def run_scenario(name, method_type, setup, calls):
+    m=setup(calls+1)
+    m()     # warm up connections and lazy initialisation
+    latencies=[]
+    rss_start=peak_memory_start()
+    start=time.time()
+    for i in range(calls):
+        t=time.time()
+        m()
+        latencies.append(time.time()-t)
+    elapsed=time.time()-start
+    memory=peak_memory_stop(rss_start)
+
+    ret={
+        'name': name,
+        'method_type': method_type,
+        'calls': calls,
+        'elapsed_s': round(elapsed, 6),
+        'throughput_per_s': round(calls/elapsed, 2) if elapsed>0 else None,
+        'latency_ms': {
+            p: round(percentile(latencies, q)*1000, 3)
+            for (p, q) in (('p50', 50), ('p90', 90), ('p99', 99), ('max', 100))
+        },
+    }
+    ret.update(memory)
+    return ret
+
+
+def run_isolated(name, calls):
+    """Run the scenario <name> in a new interpreter and return its results."""
+    out=subprocess.check_output([sys.executable, '-m', 'benchmarks.run', '--no-isolate', '--calls', str(calls),
+                                 '--scenario', name])
+    return json.loads(out)['results']
+
+
+def main(argv=None):
+    parser=argparse.ArgumentParser(description="Benchmark the gl2api client against a fake Graylog server")
+    parser.add_argument('--calls', type=int, default=100, help="calls per scenario")
+    parser.add_argument('--scenario', action='append', help="run only the given scenario(s)")
+    parser.add_argument('--output', help="write the JSON results to this file instead of stdout")
+    parser.add_argument('--isolate', dest='isolate', action='store_true', default=tracemalloc is None,
+                        help="run every scenario in a new interpreter, the default without tracemalloc")
+    parser.add_argument('--no-isolate', dest='isolate', action='store_false',
+                        help="run all scenarios in this process")
+    args=parser.parse_args(argv)
+
+    with FakeGraylog() as server:
+        with make_api(server.url) as api:
+            results=[]
+            for (name, method_type, setup) in scenarios(api, server):
+                if args.scenario and name not in args.scenario:
+                    continue
+                if args.isolate:
+                    results.extend(run_isolated(name, args.calls))
+                    continue
+                calls=args.calls if not name.startswith('search') else max(1, args.calls//10)
+                results.append(run_scenario(name, method_type, setup, calls))
+                sys.stderr.write("{name:24s} {throughput_per_s:>10} calls/s  p50 {p50:>9}ms  p99 {p99:>9}ms\n".format(
+                    p50=results[-1]['latency_ms']['p50'], p99=results[-1]['latency_ms']['p99'], **results[-1]))
+
+    report={
+        'timestamp': datetime.utcnow().isoformat()+'Z',
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    out=json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(out)
+    else:
+        print(out)
+
+
+if __name__ == '__main__':
+    main()
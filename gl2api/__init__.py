@@ -1,6 +1,8 @@
-from .base import DAO, API
+from .base import DAO, API, AsyncAPI  # noqa
 from marshmallow import Schema, fields, post_load
 from marshmallow.validate import OneOf
+from .columnar import load_columnar
+from .registry import ApiRegistry
 
 
 class InputTypeConfigurationOption(DAO):
@@ -272,7 +274,7 @@ class StreamSchema(Schema):
         "list": { "method": "GET", "field": "streams" },
         "get": {"method": "GET", "path": "streams/{id}"},
         "add": {"method": "POST", "get_attr_map": {"stream_id": "id"}},
-        "update": {"method": "PUT", "path": "streams/{id}"},
+        "update": {"method": "PUT", "path": "streams/{id}", "partial": True},
         "delete": {"method": "DELETE", "path": "streams/{id}"},
         "resume": {"method": "POST", "path": "streams/{id}/resume", "no_get": True}
     }
@@ -378,34 +380,83 @@ class SearchResults(DAO):
     pass
 
 
-class DictMessage(DAO):
- 
+class DictMessage(object):
+    """Read-only search message, that provides attribute access to the raw hit.
+
+    The message only keeps a reference to the dictionary of the hit, instead of
+    copying every key into an instance __dict__, which keeps the per message
+    overhead low for large result pages.
+    """
+    __slots__=('_data',)
+    NAME="DictMessage"
+
+    def __init__(self, _data=None, **kwargs):
+        object.__setattr__(self, '_data', _data if _data is not None else kwargs)
+
+    def __getattr__(self, name):
+        if name=='_data':
+            raise AttributeError(name)
+        try:
+            return self._data[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("{} is read-only".format(self.NAME))
+
+    def __getstate__(self):
+        return self._data
+
+    def __setstate__(self, state):
+        object.__setattr__(self, '_data', state)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._data==other._data
+
+    def __ne__(self, other):
+        return not self==other
+
+    def get(self, name, default=None):
+        return self._data.get(name, default)
+
+    def to_dict(self):
+        return self._data
+
     def __repr__(self):
         def attr_filter(x):
-            return not (callable(x) or (isinstance(x, basestring) and x.startswith('__')))
+            return not (isinstance(x, basestring) and x.startswith('__'))
 
-        # import pdb ; pdb.set_trace()
         ret=self.NAME+'('
-
-        for (i, k) in enumerate(filter(attr_filter, sorted(self.__dict__.keys()))):
+        for (i, k) in enumerate(filter(attr_filter, sorted(self._data.keys()))):
             if i>0: 
                 ret=ret+", "
-            ret=ret+"{}={}".format(k, getattr(self, k))
+            ret=ret+"{}={}".format(k, self._data[k])
         ret=ret+')'
         return ret
 
 
 class ELMessage(DictMessage):
+    __slots__=()
     NAME="ELMessage"
 
 
 class GL2Message(DictMessage):
+    __slots__=()
     NAME="GL2Message"
 
 
+def make_message(data):
+    """Convert a raw search hit into an ELMessage with embedded GL2Message."""
+    message=data.get('message')
+    if isinstance(message, dict):
+        data['message']=GL2Message(message)
+    return ELMessage(data)
+
+
 class SearchSchema(Schema):
     _methods={
-        "list": { "method": "GET" }
+        "list": { "method": "GET", "stream_field": "messages" },
+        "iterate": { "method": "GET", "paged": True, "stream_field": "messages" }
     }
 
     query=fields.String()
@@ -419,15 +470,33 @@ class SearchSchema(Schema):
     to=fields.DateTime()
     decoration_stats=fields.Dict(allow_none=True)
 
+    @staticmethod
+    def project_item(data, fields):
+        """Keep only the message fields of a raw hit, that are in <fields>."""
+        message=data.get('message')
+        if isinstance(message, dict):
+            data['message']={k: message[k] for k in fields if k in message}
+        return data
+
+    @staticmethod
+    def project(data, fields):
+        """Project the messages of the raw response to <fields>, before they are loaded."""
+        for hit in data.get('messages') or []:
+            SearchSchema.project_item(hit, fields)
+        return data
+
+    @staticmethod
+    def load_item(data):
+        """Create a message from a single raw hit, used for streaming responses."""
+        return make_message(data)
+
+    @staticmethod
+    def load_columnar(data, columns=None):
+        """Create ColumnarResults from the raw response, instead of message objects."""
+        return load_columnar(data, columns)
+
     @post_load
     def make_obj(self, data):
-
-        def make_message(data):
-            el_message=ELMessage(**data)
-            if 'message' in data:
-                el_message.message=GL2Message(**el_message.message)
-            return el_message
-
         res=SearchResults(**data)
         res.messages=map(make_message, res.messages)
         return res
@@ -441,32 +510,51 @@ class AbsoluteSearchSchema(SearchSchema):
     _path="search/universal/absolute"
 
 
-_api=None
+RESOURCES=(
+    ('inputs', InputSchema),
+    ('input_types', InputTypeSchema),
+    ('index_retention_strategies', IndexRetentionSchema),
+    ('index_rotation_strategies', IndexRotationSchema),
+    ('index_sets', IndexSetSchema),
+    ('ldap_config', LDAPConfigSchema),
+    ('streams', StreamSchema),
+    ('stream_rule_types', StreamRuleTypeShema),
+    ('stream_rules', StreamRuleSchema),
+    ('roles', RoleSchema),
+    ('extractors', ExtractorSchema),
+    ('relative_search', RelativeSearchSchema),
+    ('absolute_search', AbsoluteSearchSchema),
+)
 
 
-def get_api(url=None, *args, **kwargs):
-    """Initialize and return the api object.
+def create_api(url, *args, **kwargs):
+    """Create an API object for the Graylog at <url> with endpoint variables for all supported schemas.
 
-    The method  initializes a singleton API object and returns it. The API
-    object contains endpoint variables for supported schemas.
+    The resources are added lazily on first access, unless lazy=False is passed.
     """
-    global _api
-    if _api is None and url is not None:
-        _api=API(url, *args, **kwargs)
-        _api.add_resource(name="inputs", schema=InputSchema)
-        _api.add_resource(name="input_types", schema=InputTypeSchema)
-        _api.add_resource(name='index_retention_strategies', schema=IndexRetentionSchema)
-        _api.add_resource(name='index_rotation_strategies', schema=IndexRotationSchema)
-        _api.add_resource(name='index_sets', schema=IndexSetSchema)
-        _api.add_resource(name="ldap_config", schema=LDAPConfigSchema)
-        _api.add_resource(name='streams', schema=StreamSchema)
-        _api.add_resource(name='stream_rule_types', schema=StreamRuleTypeShema)
-        _api.add_resource(name="stream_rules", schema=StreamRuleSchema)
-        _api.add_resource(name='roles', schema=RoleSchema)
-        _api.add_resource(name='extractors', schema=ExtractorSchema)
-        _api.add_resource(name='relative_search', schema=RelativeSearchSchema)
-        _api.add_resource(name='absolute_search', schema=AbsoluteSearchSchema)
-        _api.get_input_types=_get_input_types.__get__(_api, API)
-    return _api
+    lazy=kwargs.pop('lazy', True)
+    api=API(url, *args, **kwargs)
+    for (name, schema) in RESOURCES:
+        api.add_resource(name=name, schema=schema, lazy=lazy)
+    api.get_input_types=_get_input_types.__get__(api, API)
+    return api
+
 
+registry=ApiRegistry(create_api)
 
+DEFAULT_API='default'
+
+
+def get_api(url=None, *args, **kwargs):
+    """Initialize and return the default api object.
+
+    The first call with an url creates the API object, later calls return the
+    same object. The API object contains endpoint variables for supported
+    schemas. Further APIs, e.g. for other clusters, are registered by name in
+    the registry:
+
+        prod=registry.get_or_create('prod', "http://prod:9000/api", auth=auth)
+    """
+    if url is None:
+        return registry.get(DEFAULT_API)
+    return registry.get_or_create(DEFAULT_API, url, *args, **kwargs)
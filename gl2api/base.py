@@ -1,39 +1,130 @@
+import copy
+import datetime
+import json
 import re
+import threading
 import time
 import requests
 import requests.exceptions
 import urllib
+from requests.adapters import HTTPAdapter
 from functools import partial
+from multiprocessing.pool import ThreadPool
 from marshmallow import fields
 from marshmallow.marshalling import Unmarshaller
-from .util import loggingFactory
+from .util import loggingFactory, time_slices, gzip_bytes
+from .retry import RetryPolicy
+from .bulk import run_bulk
+from .lazy import LazyList
+from .nodes import NodePool
+
+try:
+    import ijson
+    # ijson>=3 can return floats instead of Decimals
+    _IJSON_ARGS={'use_float': True} if int(getattr(ijson, '__version__', '2').split('.')[0])>=3 else {}
+except ImportError:     # pragma: no cover
+    ijson=None
 
 _getLogger=loggingFactory()
 
 
+# attributes of the change tracking, that aren't object attributes
+_TRACKING_ATTRS=frozenset(('_dirty_fields', '_tracked', '_clean_state'))
+
+
+# values, that are kept as they are by _plain() and aren't recorded by mark_clean()
+_IMMUTABLE_TYPES=frozenset((str, unicode, int, long, float, bool, type(None), datetime.datetime))
+
+
+def _plain(value):
+    """Copy value with DAOs converted into dicts, for comparing the state of objects."""
+    if type(value) in _IMMUTABLE_TYPES:
+        return value
+    elif isinstance(value, DAO):
+        return {k: _plain(v) for (k, v) in value.__dict__.iteritems() if k not in _TRACKING_ATTRS}
+    elif isinstance(value, dict):
+        # most nested dicts, like the stream rules, are flat
+        ret=dict(value)
+        for (k, v) in value.iteritems():
+            if type(v) not in _IMMUTABLE_TYPES:
+                ret[k]=_plain(v)
+        return ret
+    elif isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    elif isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    return value
+
+
 class DAO(object):
+    """Base class of the resource objects.
+
+    Objects loaded or saved by the API are tracked: attributes that are set or
+    deleted are dirty fields, as well as dicts, lists, sets and nested objects,
+    that were changed in place. mark_clean() records a copy of these mutable
+    values only, which costs a few microseconds per object; loads that don't
+    need the tracking can skip it with track=False. Updating a tracked object
+    without dirty fields with the update method doesn't send a request, and
+    methods with the "partial" flag only send the dirty fields. The state is
+    recorded again after a successful save.
+    """
 
     def __init__(self, **kwargs):
-        self._dirty_fields=set()
-        for k, v in kwargs.items():
-            setattr(self, k, v)
+        self.__dict__.update(kwargs)
+        self.__dict__['_dirty_fields']=set()
+        self.__dict__['_tracked']=False
+        self.__dict__['_clean_state']=None
+
+    def __setattr__(self, k, v):
+        # schema fields can start with _, like the _type of stream rules
+        if k not in _TRACKING_ATTRS:
+            self._dirty_fields.add(k)
+        object.__setattr__(self, k, v)
+
+    def __delattr__(self, k):
+        if k not in _TRACKING_ATTRS:
+            self._dirty_fields.add(k)
+        object.__delattr__(self, k)
 
     def update(self, **kwargs):
         for k, v in kwargs.items():
             if hasattr(self, k):
                 if getattr(self, k)!=v:
                     setattr(self, k, v)
-                    self._dirty_fields.add(k)
             else:
                 setattr(self, k, v)
                 self._is_dirty=True
-                self._dirty_fields.add(k)
+
+    def dirty_fields(self):
+        """Return the names of the attributes, that were set or changed since mark_clean()."""
+        ret=set(self._dirty_fields)
+        clean=self._clean_state
+        if clean is not None:
+            # replaced and deleted attributes are already in _dirty_fields
+            current=self.__dict__
+            ret.update(k for (k, v) in clean.iteritems() if k not in ret and k in current and
+                       _plain(current[k])!=v)
+        return ret
 
     def is_dirty(self):
-        return len(self._dirty_fields)>0
+        return len(self.dirty_fields())>0
 
     def is_field_dirty(self, field_name):
-        return field_name in self._dirty_fields
+        return field_name in self.dirty_fields()
+
+    def mark_clean(self):
+        """Record the mutable values and track the changes from now on."""
+        self.__dict__['_dirty_fields']=set()
+        self.__dict__['_tracked']=True
+        self.__dict__['_clean_state']={k: _plain(v) for (k, v) in self.__dict__.iteritems()
+                                       if type(v) not in _IMMUTABLE_TYPES and k not in _TRACKING_ATTRS}
+
+    def __setstate__(self, state):
+        # objects pickled before the change tracking
+        state.setdefault('_dirty_fields', set())
+        state.setdefault('_tracked', False)
+        state.setdefault('_clean_state', None)
+        self.__dict__.update(state)
 
 
 class Resource(object):
@@ -51,6 +142,37 @@ class ApiError(Exception):
         super(ApiError, self).__init__(msg)
 
 
+class MethodPlan(object):
+    """Per method data, that is prepared once when a resource is added.
+
+    It holds the parsed path placeholders and the schema instances used to
+    (de)serialize the objects of the method, so they aren't rebuilt for every
+    request.
+    """
+
+    def __init__(self, ObjectSchema, method_info):
+        self.path=method_info['path'] if 'path' in method_info else ObjectSchema._path
+        self.placeholders=tuple(field[1:-1] for field in re.findall(r'\{.*?\}', self.path))
+        self.schema=ObjectSchema(strict=True)
+        self.dump_schema=ObjectSchema()
+        # the keys of the attributes in the dumped data, for partial updates
+        self.dump_keys={
+            name: field.dump_to or name for (name, field) in self.dump_schema.fields.items() if not field.load_only}
+        if 'field' in method_info:
+            self.field_def={
+                method_info['field']: fields.Nested(ObjectSchema, many=True),
+                "total": fields.Integer()
+            }
+        else:
+            self.field_def=None
+
+    @staticmethod
+    def get(ObjectSchema, method_info):
+        """Return the compiled plan of method_info, or compile one for plain method infos."""
+        plan=method_info.get('plan')
+        return plan if plan is not None else MethodPlan(ObjectSchema, method_info)
+
+
 class API(object):
     """The very simple JIRA API.
 
@@ -75,130 +197,450 @@ class API(object):
         api.add_resource(name='index_rotation_strategies', schema=IndexRotationSchema)
 
         api.index_rotation_strategies.list()
+
+    Responses of slow changing resources can be cached by passing a cache, see
+    gl2api.cache.ResponseCache, or gl2api.cache.DiskCache to keep them across
+    processes.
+
+    All requests go through a pooled keep-alive session, that is shared by
+    all resources. The pool should be released with close(), or by using the
+    API as context manager:
+
+        with API("http://localhost:9000/api", auth=auth, pool_size=20) as api:
+            ...
+
+    Failed requests are retried according to the <retry> policy, see
+    gl2api.retry.RetryPolicy. The latency, size and status code of the
+    requests are reported per resource method to the sinks of <metrics>, see
+    gl2api.metrics.Metrics.
+
+    Responses are requested gzip compressed, unless <compress> is False. With
+    <compress_requests>, request bodies of at least this many bytes are sent
+    gzip compressed as well, which requires a server that accepts compressed
+    requests. The metrics report the compressed and uncompressed sizes.
+
+    <root_url> can also be a list with the URLs of all nodes of a cluster.
+    The requests are distributed over the nodes by the given <strategy> and
+    fail over to another node if one is down. With <pin_writes> all writes
+    go to the master node, see gl2api.nodes.NodePool:
+
+        api=API(["http://gl1:9000/api", "http://gl2:9000/api"], auth=auth, strategy='least_latency')
+
+    After a write, the saved object is re-fetched with the get method of the
+    resource. <refetch> selects a cheaper way for all writes, or per call:
+
+        api=API("http://localhost:9000/api", auth=auth, refetch='defer')
+        rules=[api.stream_rules.add(rule) for rule in new_rules]
+        api.refetch_deferred()
     """
-    
-    RETRY=10
 
-    def __init__(self, root_url, timeout=10, auth=None):
-        self.root_url=root_url
+    REFETCH_MODES=('get', 'response', 'local', 'defer')
+
+    def __init__(self, root_url, timeout=10, auth=None, pool_size=10, pool_block=False, headers=None, cache=None,
+                 retry=None, refetch='get', metrics=None, compress=True, compress_requests=None,
+                 strategy='round_robin', pin_writes=False, master=None):
+        if refetch not in self.REFETCH_MODES:
+            raise ValueError("Invalid refetch mode: {}".format(refetch))
+        self.nodes=NodePool(root_url, strategy=strategy, pin_writes=pin_writes, master=master)
+        self.root_url=self.nodes.nodes[0].url
         self.timeout=timeout
         self.auth=auth
+        self.cache=cache
+        self.retry_policy=retry if retry is not None else RetryPolicy()
+        self.refetch=refetch
+        self.metrics=metrics
+        self.compress=compress
+        self.compress_requests=compress_requests
+        self.pool_size=pool_size
+        self._deferred=[]
+        self._deferred_lock=threading.Lock()
+        self._lazy_resources={}
+        self._resource_lock=threading.Lock()
+        self.session=self._make_session(pool_size, pool_block, headers)
+
+    def _make_session(self, pool_size, pool_block, headers):
+        """Create the keep-alive session with a connection pool of <pool_size> per host."""
+        session=requests.Session()
+        adapter=HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=pool_block)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.auth=self.auth
+        session.headers.update({"Accept": "application/json",
+                                "Accept-Encoding": "gzip, deflate" if self.compress else "identity"})
+        if headers:
+            session.headers.update(headers)
+        return session
+
+    def close(self):
+        """Release all pooled connections."""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     @staticmethod
     def retry(m, *args, **kwargs):
-        for i in xrange(0, 12):
-            try:
-                return m(*args, **kwargs)
-            except requests.exceptions.ConnectionError:
-                if i<2:
-                    _getLogger().warn('Connection error, retrying in %ds', API.RETRY)
-                    time.sleep(API.RETRY)
-                else:
-                    _getLogger().error('Unable to connect')
-                    raise
-
+        """Call m with the default retry policy, for connection errors only."""
+        return RetryPolicy().call(None, m, *args, **kwargs)
+
+    def _request(self, method, path, method_info, body_size=None, **kwargs):
+        """Send the request for <path> through the pooled session to a node of the cluster.
+
+        The request is retried, possibly on another node, according to the retry
+        policy. <body_size> is the uncompressed size of a compressed request body.
+        """
+        write=method!='GET'
+        if write and self.nodes.pin_writes and self.nodes.master is None:
+            self.nodes.discover_master(self.session)
+        if self.metrics is None:
+            return self.retry_policy.call(method, self.nodes.send, self.session, method, path, write, **kwargs)
+
+        start=time.time()
+        r=self.retry_policy.call(method, self.nodes.send, self.session, method, path, write, **kwargs)
+        data=kwargs.get('data')
+        sent=len(data) if data is not None else 0
+        self.metrics.request(method_info, method, r, time.time()-start, self.retry_policy.last_attempts()-1,
+                             stream=kwargs.get('stream', False), sent=(body_size or sent, sent))
+        return r
+
+    def _encode_body(self, payload, headers):
+        """Return the JSON body and its uncompressed size, the body is gzipped if it is large enough."""
+        body=json.dumps(payload)
+        size=len(body)
+        if self.compress_requests is not None and size>=self.compress_requests:
+            body=gzip_bytes(body)
+            headers['Content-Encoding']='gzip'
+        return (body, size)
+
+    def _timed_load(self, method_info, load):
+        """Return load() and report the time it took to the metrics."""
+        if self.metrics is None:
+            return load()
+        start=time.time()
+        ret=load()
+        self.metrics.load(method_info, time.time()-start)
+        return ret
 
     def _makeUrl(self, method_info, Object_Schema, kwargs): # noqa
+        """Return the path of the request relative to the root URL of the nodes."""
         url=method_info['path'] if 'path' in method_info else Object_Schema._path
-        url=self.root_url+'/'+url
         if 'query_params' in kwargs:
-            url=url+'?'+urllib.urlencode(kwargs['query_params'])
+            params=kwargs['query_params']
+            if isinstance(params, dict):
+                # sorted for stable URLs, e.g. as cache keys
+                params=sorted(params.items())
+            url=url+'?'+urllib.urlencode(params)
             del kwargs['query_params']
         return url.format(**kwargs)
 
     def _get(self, ObjectSchema, method_info, timeout=2.0, auth=None, *args, **kwargs): # noqa
         headers={"Accept": "application/json"}
+        stream=kwargs.pop('stream', False)
+        if stream and 'stream_field' not in method_info:
+            raise InvalidMethodType("Method doesn't support streaming: {}".format(method_info))
+        columnar=kwargs.pop('columnar', None)
+        if columnar and not hasattr(ObjectSchema, 'load_columnar'):
+            raise InvalidMethodType("Schema doesn't support columnar results: {}".format(ObjectSchema.__name__))
+        if stream and ijson is None:
+            raise ImportError("Streaming requires the ijson package")
+        track=kwargs.pop('track', True)
+        lazy=kwargs.pop('lazy', False)
+        if lazy and 'field' not in method_info:
+            raise InvalidMethodType("Method doesn't support lazy loading: {}".format(method_info))
+        fields=kwargs.pop('fields', None)
+        if fields:
+            if not hasattr(ObjectSchema, 'project'):
+                raise InvalidMethodType("Schema doesn't support fields: {}".format(ObjectSchema.__name__))
+            # the server only returns the requested message fields
+            fields=list(fields)
+            query_params=kwargs.get('query_params') or {}
+            query_params=query_params.items() if isinstance(query_params, dict) else list(query_params)
+            kwargs['query_params']=dict([(k, v) for (k, v) in query_params if k!='fields'], fields=",".join(fields))
+
         url=self._makeUrl(method_info, ObjectSchema, kwargs)
-        r=API.retry(requests.get, url, timeout=timeout, auth=auth, headers=headers)
-        unmarshaller=Unmarshaller()
-        if r.status_code==200:
-            # if we have a field, in the method info, we expect a collection back
-            # otherwise it will be just a single element
-            if 'field' in method_info:
-                field_def={
-                    method_info['field']: fields.Nested(ObjectSchema, many=True),
-                    "total": fields.Integer()
-                }
-                data=unmarshaller(r.json(), field_def, partial=True)
-                return data[method_info['field']]
-
-            elif 'dict' in method_info and method_info['dict']:
-                data=r.json()
-                schema=ObjectSchema(strict=True)
-                ret={
-                    k: schema.load(v).data
-                    for (k, v) in data.iteritems()
-                }
-                return ret
-
-            elif 'list' in method_info and method_info['list']:
-                data=r.json()
-                schema=ObjectSchema(strict=True)
-                return [schema.load(v).data for v in data]
-                
-            else:
-                data=ObjectSchema(strict=True).load(r.json())
-                return data.data
 
+        # only plain loads of resources with a TTL are cached
+        resource=method_info.get('resource')
+        cache=self.cache
+        if cache is None or resource is None or stream or columnar or lazy or method_info.get('no_cache') or \
+                cache.ttl_for(resource) is None:
+            cache=None
+        entry=None
+        if cache is not None:
+            entry=cache.lookup(resource, url)
+            if entry is not None and entry.is_fresh():
+                return entry.value
+            elif entry is not None and entry.can_revalidate():
+                if entry.etag is not None:
+                    headers['If-None-Match']=entry.etag
+                if entry.last_modified is not None:
+                    headers['If-Modified-Since']=entry.last_modified
+
+        r=self._request('GET', url, method_info, timeout=timeout, auth=auth, headers=headers, stream=stream)
+        if stream:
+            if r.status_code==200:
+                return API._stream_items(r, ObjectSchema, method_info['stream_field'], fields)
+            r.close()
+            r.raise_for_status()
+
+        def body():
+            # older servers ignore the fields parameter, the messages are projected here as well
+            return ObjectSchema.project(r.json(), fields) if fields else r.json()
+
+        mark_clean=API._mark_clean if track and method_info.get('track') else lambda ret: ret
+        if r.status_code==304 and entry is not None:
+            cache.refresh(url, entry)
+            return entry.value
+        elif r.status_code==200 and columnar:
+            return self._timed_load(method_info, lambda: ObjectSchema.load_columnar(
+                body(), None if columnar is True else list(columnar)))
+        elif r.status_code==200 and lazy:
+            schema=MethodPlan.get(ObjectSchema, method_info).schema
+            return self._timed_load(method_info, lambda: LazyList(
+                r.json().get(method_info['field']) or [], lambda item: mark_clean(schema.load(item).data), schema))
+        elif r.status_code==200:
+            ret=self._timed_load(
+                method_info, lambda: mark_clean(self._load(ObjectSchema, method_info, body())))
+            # untracked objects aren't shared with the loads, that track them
+            if cache is not None and (track or not method_info.get('track')):
+                cache.store(resource, url, ret, r.headers.get('ETag'), r.headers.get('Last-Modified'))
+            return ret
         else:
             r.raise_for_status()
 
+    def _load(self, ObjectSchema, method_info, data):    # noqa
+        """Deserialize the decoded response <data> of a GET request."""
+        plan=MethodPlan.get(ObjectSchema, method_info)
+
+        # if we have a field, in the method info, we expect a collection back
+        # otherwise it will be just a single element
+        if plan.field_def is not None:
+            # the unmarshaller collects errors and can't be shared
+            data=Unmarshaller()(data, plan.field_def, partial=True)
+            return data[method_info['field']]
+
+        elif 'dict' in method_info and method_info['dict']:
+            schema=plan.schema
+            ret={
+                k: schema.load(v).data
+                for (k, v) in data.iteritems()
+            }
+            return ret
+
+        elif 'list' in method_info and method_info['list']:
+            schema=plan.schema
+            return [schema.load(v).data for v in data]
+            
+        else:
+            return plan.schema.load(data).data
+
     @staticmethod
-    def _args_from_path(path, obj, kwargs):
-        if isinstance(obj, dict):
-            _hasattr=lambda x: x in obj     # noqa
-            _getattr=lambda x: obj[x]       # noqa
+    def _mark_clean(ret):
+        """Track the changes of the loaded DAOs, ret is an object, a list or a dict of objects."""
+        if isinstance(ret, DAO):
+            ret.mark_clean()
+        elif isinstance(ret, (list, dict)):
+            for obj in (ret.itervalues() if isinstance(ret, dict) else ret):
+                if isinstance(obj, DAO):
+                    obj.mark_clean()
+        return ret
+
+    def _invalidate(self, method_info):
+        """Drop cached responses and the lookup index of the resource, after it was modified."""
+        resource=method_info.get('resource')
+        if resource is None:
+            return
+        if self.cache is not None:
+            self.cache.invalidate(resource)
+        # see gl2api.search.get_index
+        index=getattr(self.__dict__.get(resource), '_index', None)
+        if index is not None:
+            index.invalidate()
+
+    @staticmethod
+    def _stream_items(r, ObjectSchema, field, fields=None):
+        """Generator that incrementally parses the array <field> of the response body.
+
+        Every element is converted with ObjectSchema.load_item() as soon as it is
+        parsed, so the complete body is never held in memory. With <fields> the
+        elements are projected with ObjectSchema.project_item() first.
+        """
+        try:
+            r.raw.decode_content=True
+            for item in ijson.items(r.raw, field+'.item', **_IJSON_ARGS):
+                yield ObjectSchema.load_item(ObjectSchema.project_item(item, fields) if fields else item)
+        finally:
+            r.close()
+
+    def _iterate(self, ObjectSchema, method_info, timeout=2.0, auth=None, page_size=1000, prefetch=True,    # noqa
+                 slice_size=None, *args, **kwargs):
+        """Generator over the messages of a search, that are fetched page by page.
+
+        The pages are requested with offset/limit of <page_size> and, if <prefetch>
+        is set, the next page is fetched in the background while the current one
+        is consumed. With <slice_size> (a timedelta or seconds) the from/to range
+        of an absolute search is split into consecutive time slices, which are
+        paged one after the other. The slices don't overlap, see
+        gl2api.util.time_slices. With stream=True each page is parsed
+        incrementally, in which case the next page is only requested after the
+        current one has been consumed.
+
+            for msg in api.absolute_search.iterate(query_params={
+                    'query': 'level:<=3', 'from': '2018-07-01T00:00:00.000Z', 'to': '2018-07-08T00:00:00.000Z'},
+                    slice_size=timedelta(hours=6)):
+                print(msg.message.source)
+        """
+        query_params=dict(kwargs.pop('query_params', {}))
+        if kwargs.get('stream'):
+            prefetch=False
+        if slice_size is None:
+            windows=[query_params]
+        elif 'from' in query_params and 'to' in query_params:
+            windows=[
+                dict(query_params, **{'from': _from, 'to': to})
+                for (_from, to) in time_slices(query_params['from'], query_params['to'], slice_size)
+            ]
         else:
-            _hasattr=lambda x: hasattr(obj, x)  # noqa
-            _getattr=lambda x: getattr(obj, x)  # noqa
+            raise ValueError("slice_size requires from and to query parameters")
+
+        pool=ThreadPool(1) if prefetch else None
+        try:
+            for params in windows:
+                for msg in self._iter_pages(ObjectSchema, method_info, timeout, auth, page_size, pool, params, kwargs):
+                    yield msg
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+    def _iter_pages(self, ObjectSchema, method_info, timeout, auth, page_size, pool, query_params, kwargs):    # noqa
+        def fetch(offset):
+            params=dict(query_params, offset=offset, limit=page_size)
+            return self._get(ObjectSchema, method_info, timeout, auth, query_params=params, **kwargs)
+
+        offset=query_params.get('offset', 0)
+        if kwargs.get('stream'):
+            while True:
+                count=0
+                for msg in fetch(offset):
+                    count+=1
+                    yield msg
+                offset+=count
+                if count<page_size:
+                    return
+
+        page=fetch(offset)
+        while True:
+            messages=page.messages
+            offset+=len(messages)
+            more=len(messages)==page_size and (page.total_results is None or offset<page.total_results)
+            next_page=pool.apply_async(fetch, (offset,)) if more and pool is not None else None
+            page=None
+            for msg in messages:
+                yield msg
+            if not more:
+                return
+            page=next_page.get() if next_page is not None else fetch(offset)
 
-        for field in re.findall(r'\{.*?\}', path):
-            field=field[1:-1]
-            if _hasattr(field):
-                kwargs[field]=_getattr(field)
+    @staticmethod
+    def _args_from_path(placeholders, obj, kwargs):
+        """Copy the attributes named by the path <placeholders> from obj into kwargs."""
+        if isinstance(obj, dict):
+            for field in placeholders:
+                if field in obj:
+                    kwargs[field]=obj[field]
+        else:
+            for field in placeholders:
+                if hasattr(obj, field):
+                    kwargs[field]=getattr(obj, field)
 
     def _put_post(self, obj, Schema, method_info, timeout=2.0, auth=None, is_post=True, *args, **kwargs):   # noqa
+        """Save obj with a POST or PUT request and return the saved object.
+
+        How the saved object is obtained is selected with <refetch>, per call or
+        with the default of the API:
+
+            get         re-fetch the object with the get method of the resource
+            response    load the object from the body of the write response, for
+                        endpoints that return the saved object; like local if
+                        the body only contains the ids
+            local       copy obj and set the ids returned by the write response
+            defer       like local, the objects are re-fetched with one list()
+                        call per resource on refetch_deferred()
+        """
         headers={"Content-Type": "application/json"}
-        data=Schema().dump(obj)
+        refetch=kwargs.pop('refetch', None) or self.refetch
+        if refetch not in self.REFETCH_MODES:
+            raise ValueError("Invalid refetch mode: {}".format(refetch))
+        plan=MethodPlan.get(Schema, method_info)
+        tracked=isinstance(obj, DAO) and obj._tracked
+        dirty=obj.dirty_fields() if tracked else None
+        # other PUT methods, like set_default of index sets, are actions on unchanged objects
+        if method_info.get('name')=='update' and tracked and not dirty:
+            _getLogger('_put_post').debug("Object is unchanged, not saved: {}".format(obj))
+            return obj
+        payload=plan.dump_schema.dump(obj).data
 
         # construct URL from path, given object and kwargs        
         _kwargs={}
-        path=method_info['path'] if 'path' in method_info else Schema._path
-        API._args_from_path(path, obj, _kwargs)
+        API._args_from_path(plan.placeholders, obj, _kwargs)
         _kwargs.update(kwargs)
 
         # remove attributes that shouldn't be posted
         if 'filter_attr' in method_info:
             for a in method_info['filter_attr']:
-                del data.data[a]
-
-        url=self._makeUrl(method_info, Schema, _kwargs)
-        if is_post:
-            r=API.retry(requests.post, url, json=data.data, timeout=timeout, auth=auth, headers=headers)
-        else:
-            r=API.retry(requests.put, url, json=data.data, timeout=timeout, auth=auth, headers=headers)
-        if r.status_code in (200, 201):
-            data=r.json()
+                del payload[a]
+
+        # endpoints that accept partial updates only get the changed fields
+        if not is_post and tracked and method_info.get('partial'):
+            keys=set(plan.dump_keys[k] for k in dirty if k in plan.dump_keys)
+            payload={k: v for (k, v) in payload.items() if k in keys}
+
+        url=self._makeUrl(method_info, Schema, dict(_kwargs))
+        (body, size)=self._encode_body(payload, headers)
+        r=self._request('POST' if is_post else 'PUT', url, method_info, body_size=size, data=body, timeout=timeout,
+                        auth=auth, headers=headers)
+        if r.status_code in (200, 201, 204):
+            self._invalidate(method_info)
+            if isinstance(obj, DAO):
+                obj.mark_clean()
+            data=r.json() if r.status_code!=204 else {}
             _getLogger('_put_post').debug("Saved object, received: {}".format(data))
-            if 'get' in Schema._methods and ('no_get' not in method_info or not method_info['no_get']):
-                if 'get_attr_map' in method_info:
-                    for (k, v) in method_info['get_attr_map'].iteritems():
-                        try:
-                            _kwargs[v]=data[k]
-                        except KeyError:
-                            pass
-                else:
-                    API._args_from_path(path, data, _kwargs)
-
-                path=Schema._methods['get']['path'] if 'path' in Schema._methods['get'] else Schema._path
-                return self._get(Schema, Schema._methods['get'], timeout, auth, **_kwargs)
-            else:
+            if 'get' not in Schema._methods or ('no_get' in method_info and method_info['no_get']):
                 return data
-        elif r.status_code==204:
-            if 'get' in Schema._methods and ('no_get' not in method_info or not method_info['no_get']):
-                return self._get(Schema, Schema._methods['get'], timeout, auth)
+
+            get_info=method_info.get('get_info', Schema._methods['get'])
+            ids={}
+            if 'get_attr_map' in method_info:
+                id_keys=set(method_info['get_attr_map'].keys())
+                for (k, v) in method_info['get_attr_map'].iteritems():
+                    try:
+                        ids[v]=data[k]
+                    except KeyError:
+                        pass
             else:
-                return data
+                API._args_from_path(MethodPlan.get(Schema, get_info).placeholders, data, ids)
+                id_keys=set(ids.keys())
+            _kwargs.update(ids)
+
+            if refetch=='response' and data:
+                if set(data.keys())-id_keys:
+                    return API._copy_with(API._mark_clean(plan.schema.load(data).data), ids)
+                # most create endpoints only return the new id
+                refetch='local'
+            if refetch in ('local', 'defer'):
+                # the path arguments of the list, like the input_id of extractors, may only be call arguments
+                list_kwargs={}
+                if 'list_info' in method_info:
+                    list_kwargs={k: _kwargs[k] for k in MethodPlan.get(Schema, method_info['list_info']).placeholders
+                                 if k in _kwargs}
+                saved=API._copy_with(obj, dict(list_kwargs, **ids))
+                if refetch=='defer' and 'list_info' in method_info:
+                    self._defer_refetch(Schema, method_info['list_info'], list_kwargs, saved)
+                return saved
+            return self._get(Schema, get_info, timeout, auth, **_kwargs)
         elif r.status_code>=400 and r.status_code<500:
             raise ApiError(r)
         else:
@@ -206,33 +648,143 @@ class API(object):
             _getLogger('_put_post').error('Status code error {}: {}'.format(r.status_code, r.text))
             r.raise_for_status()
 
+    @staticmethod
+    def _copy_with(obj, attrs):
+        """Return a copy of obj with the given attributes set."""
+        if isinstance(obj, dict):
+            ret=dict(obj)
+            ret.update(attrs)
+            return ret
+        ret=copy.copy(obj)
+        if isinstance(ret, DAO):
+            ret.__dict__.update(attrs)
+            ret.mark_clean()
+            return ret
+        for (k, v) in attrs.items():
+            setattr(ret, k, v)
+        return ret
+
+    def _defer_refetch(self, Schema, list_info, list_kwargs, obj):    # noqa
+        with self._deferred_lock:
+            self._deferred.append((Schema, list_info, list_kwargs, obj))
+
+    def refetch_deferred(self):
+        """Refresh all objects saved with refetch='defer' since the last call.
+
+        The objects are re-fetched with one list() call per resource and path
+        (e.g. per stream for stream rules) and updated in place from the listed
+        object with the same id. Returns the refreshed objects. If a list() call
+        fails, its objects stay queued for the next call and the first error is
+        raised after all other groups were refreshed.
+        """
+        with self._deferred_lock:
+            deferred, self._deferred=self._deferred, []
+
+        groups={}
+        for entry in deferred:
+            (Schema, list_info, list_kwargs, obj)=entry
+            key=(list_info['resource'], tuple(sorted(list_kwargs.items())))
+            groups.setdefault(key, []).append(entry)
+
+        ret=[]
+        failed=[]
+        error=None
+        for entries in groups.values():
+            (Schema, list_info, list_kwargs, _)=entries[0]
+            try:
+                listed=self._get(Schema, dict(list_info, no_cache=True), self.timeout, self.auth, **list_kwargs)
+            except Exception as e:
+                _getLogger('refetch_deferred').error("Failed to re-fetch %s %s: %s", list_info['resource'],
+                                                     list_kwargs, e)
+                failed.extend(entries)
+                error=error or e
+                continue
+            by_id={getattr(o, 'id', None): o for o in listed}
+            for (_, _, _, obj) in entries:
+                fresh=by_id.get(obj['id'] if isinstance(obj, dict) else getattr(obj, 'id', None))
+                if fresh is None:
+                    continue
+                if isinstance(obj, dict):
+                    obj.update(vars(fresh))
+                elif isinstance(obj, DAO):
+                    obj.__dict__.update(vars(fresh))
+                    obj.mark_clean()
+                else:
+                    for (k, v) in vars(fresh).items():
+                        setattr(obj, k, v)
+                ret.append(obj)
+
+        if failed:
+            with self._deferred_lock:
+                self._deferred[:0]=failed
+            raise error
+        return ret
+
     def _delete(self, obj, Schema, method_info, timeout=2.0, auth=None, *args, **kwargs):   # noqa
         headers={"Content-Type": "application/json"}
 
         # update kwargs with the path attributes required to identify the obj
         _kwargs={}
         _kwargs.update(kwargs)
-        path=method_info['path'] if 'path' in method_info else Schema._path
-        for field in re.findall(r'\{.*?\}', path):
-            field=field[1:-1]
+        for field in MethodPlan.get(Schema, method_info).placeholders:
             if hasattr(obj, field):
                 _kwargs[field]=getattr(obj, field)
 
         url=self._makeUrl(method_info, Schema, _kwargs)
-        r=API.retry(requests.delete, url, timeout=timeout, auth=auth, headers=headers)
+        r=self._request('DELETE', url, method_info, timeout=timeout, auth=auth, headers=headers)
         if r.status_code==204:
+            self._invalidate(method_info)
             return True
         elif r.status_code>=400 and r.status_code<500:
             raise ApiError(r)
         else:
             r.raise_for_status()            
 
-    def add_resource(self, name, schema):
-        """Configure the resource endpoint <name> based on the given <schema>."""
+    def add_resource(self, name, schema, lazy=False):
+        """Configure the resource endpoint <name> based on the given <schema>.
+
+        The method infos are copied and compiled into a MethodPlan, and writes
+        reference the compiled get method for re-fetching the saved object.
+        Resources with add, update or delete methods get the bulk variants
+        add_many, update_many and delete_many. With <lazy> this is done on the
+        first access of the resource, so short lived scripts only pay for the
+        resources they use.
+        """
+        if lazy:
+            self._lazy_resources[name]=schema
+            return
+
         res=Resource()
+        res.schema=schema
+        infos={
+            fname: dict(info, resource=name, name=fname)
+            for (fname, info) in schema._methods.items() if not callable(info)
+        }
+        # the loaded objects of resources, that can be updated, are tracked for changes
+        if 'update' in infos:
+            for info in infos.values():
+                if info['method']=='GET':
+                    info['track']=True
+        for info in infos.values():
+            info['plan']=MethodPlan(schema, info)
+        # after all plans are compiled, so the copied get info has its plan
+        for info in infos.values():
+            if 'get' in infos and info['method'] in ('POST', 'PUT'):
+                # re-fetched objects are handed to the writer and not cached
+                info['get_info']=dict(infos['get'], no_cache=True)
+            if 'list' in infos and 'field' in infos['list'] and info['method'] in ('POST', 'PUT'):
+                info['list_info']=infos['list']
+
         for (fname, info) in schema._methods.items():
             if callable(info):
                 setattr(res, fname, info)
+                continue
+
+            info=infos[fname]
+            if info['method']=='GET' and info.get('paged'):
+                setattr(res, fname,
+                        partial(self._iterate, ObjectSchema=schema, method_info=info, timeout=self.timeout,
+                                auth=self.auth))
             elif info['method']=='GET':
                 setattr(res, fname, 
                         partial(self._get, ObjectSchema=schema, method_info=info, timeout=self.timeout, auth=self.auth))
@@ -249,8 +801,80 @@ class API(object):
                         partial(self._delete, Schema=schema, method_info=info, timeout=self.timeout, auth=self.auth))
             else:
                 raise InvalidMethodType("Method: {}, type: {}".format(name, info['method']))
+
+        for fname in ('add', 'update', 'delete'):
+            if hasattr(res, fname):
+                setattr(res, fname+'_many', partial(self._bulk, getattr(res, fname)))
         setattr(self, name, res)
 
+    def __getattr__(self, name):
+        # only called for missing attributes, lazy resources are added on first access
+        lazy=self.__dict__.get('_lazy_resources')
+        if lazy is None or name not in lazy:
+            raise AttributeError(name)
+        with self._resource_lock:
+            if name not in self.__dict__:
+                self.add_resource(name, lazy[name])
+        return self.__dict__[name]
+
+    def _bulk(self, m, objs, concurrency=None, order_by=None, progress=None, **kwargs):
+        """Run the resource method m for all objs, see gl2api.bulk.run_bulk."""
+        return run_bulk(m, objs, concurrency or self.pool_size, order_by, progress, **kwargs)
+
+
+class AsyncAPI(API):
+    """Concurrent counterpart of the API.
+
+    The resources support the same methods as API, but each call is dispatched
+    to a pool of <concurrency> worker threads, that share the pooled session,
+    and returns an AsyncResult instead of the object. Paged methods are left
+    as generators and bulk methods block until all objects are processed. gather() waits for a
+    sequence of results, so it is easy to fan out many calls at once:
+
+        with AsyncAPI("http://localhost:9000/api", auth=auth, concurrency=20) as api:
+            api.add_resource(name='inputs', schema=InputSchema)
+            api.add_resource(name='extractors', schema=ExtractorSchema)
+
+            inputs=api.inputs.list().get()
+            extractors=api.gather(api.extractors.list(input_id=i.id) for i in inputs)
+    """
+
+    def __init__(self, root_url, timeout=10, auth=None, concurrency=10, **kwargs):
+        kwargs.setdefault('pool_size', concurrency)
+        super(AsyncAPI, self).__init__(root_url, timeout, auth, **kwargs)
+        self.concurrency=concurrency
+        self._pool=ThreadPool(concurrency)
+
+    def submit(self, m, *args, **kwargs):
+        """Schedule m(*args, **kwargs) on the worker pool and return its AsyncResult."""
+        return self._pool.apply_async(m, args, kwargs)
+
+    @staticmethod
+    def gather(results):
+        """Wait for all given results and return their values in order."""
+        return [r.get() for r in list(results)]
+
+    def map(self, m, iterable):
+        """Call m for every element of iterable concurrently and return the results in order."""
+        return self._pool.map(m, iterable)
+
+    def add_resource(self, name, schema, lazy=False):
+        """Configure the resource endpoint <name>, with all methods returning AsyncResults."""
+        super(AsyncAPI, self).add_resource(name, schema, lazy)
+        if lazy:
+            return
+        res=getattr(self, name)
+        for (fname, info) in schema._methods.items():
+            if isinstance(info, dict) and info.get('paged'):
+                continue
+            setattr(res, fname, partial(self.submit, getattr(res, fname)))
+
+    def close(self):
+        """Wait for outstanding calls and release the worker pool and the pooled connections."""
+        self._pool.close()
+        self._pool.join()
+        super(AsyncAPI, self).close()
+
 
 class ObjectNotFound(Exception):
     """Exception when a graylog object can't be found."""
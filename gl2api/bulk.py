@@ -0,0 +1,124 @@
+"""Bulk execution of resource methods.
+
+The bulk methods add_many, update_many and delete_many of the resources run
+the single object method for every object on a bounded thread pool, which
+shares the pooled connections of the API. Errors don't abort the run, they
+are reported per object in the BulkResult:
+
+    res=api.extractors.add_many(extractors, order_by='order', concurrency=8,
+                                progress=lambda done, total, item: log(done, total))
+    for item in res.failed:
+        print(item.obj, item.error)
+"""
+from multiprocessing.pool import ThreadPool
+
+from .util import loggingFactory
+
+_getLogger=loggingFactory('bulk')
+
+
+class BulkItem(object):
+    """Outcome of the bulk operation for one object."""
+
+    def __init__(self, index, obj, result=None, error=None):
+        self.index=index
+        self.obj=obj
+        self.result=result
+        self.error=error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return "BulkItem(index={}, ok={}, result={}, error={})".format(self.index, self.ok, self.result, self.error)
+
+
+class BulkResult(object):
+    """Items of a bulk operation in the order of the input objects."""
+
+    def __init__(self, items):
+        self.items=items
+
+    @property
+    def ok(self):
+        return all(item.ok for item in self.items)
+
+    @property
+    def results(self):
+        return [item.result for item in self.items]
+
+    @property
+    def succeeded(self):
+        return [item for item in self.items if item.ok]
+
+    @property
+    def failed(self):
+        return [item for item in self.items if not item.ok]
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __repr__(self):
+        return "BulkResult(total={}, failed={})".format(len(self.items), len(self.failed))
+
+
+def _groups(objs, order_by):
+    """Split the indexed objects into groups, that have to run one after the other."""
+    indexed=list(enumerate(objs))
+    if order_by is None:
+        return [indexed]
+
+    key=order_by if callable(order_by) else lambda obj: getattr(obj, order_by, None)
+    groups={}
+    for (i, obj) in indexed:
+        groups.setdefault(key(obj), []).append((i, obj))
+    return [groups[k] for k in sorted(groups.keys())]
+
+
+def run_bulk(m, objs, concurrency=10, order_by=None, progress=None, **kwargs):
+    """Call m(obj, **kwargs) for all objs and return a BulkResult.
+
+    With <order_by>, an attribute name or a key function, the objects are
+    processed in groups of equal keys in ascending key order; a group starts
+    when the previous one is complete. Within a group the calls run on up to
+    <concurrency> threads. <progress> is called with (done, total, item) after
+    every completed object.
+    """
+    objs=list(objs)
+    items=[None]*len(objs)
+    done=[0]
+
+    def call(indexed):
+        (i, obj)=indexed
+        try:
+            return BulkItem(i, obj, result=m(obj, **kwargs))
+        except Exception as e:
+            _getLogger('run_bulk').warn("Bulk operation failed for %s: %s", obj, e)
+            return BulkItem(i, obj, error=e)
+
+    def collect(item):
+        items[item.index]=item
+        done[0]+=1
+        if progress is not None:
+            progress(done[0], len(objs), item)
+
+    groups=_groups(objs, order_by)
+    if concurrency<=1:
+        for group in groups:
+            for indexed in group:
+                collect(call(indexed))
+        return BulkResult(items)
+
+    pool=ThreadPool(concurrency)
+    try:
+        for group in groups:
+            for item in pool.imap_unordered(call, group):
+                collect(item)
+    finally:
+        pool.close()
+        pool.join()
+    return BulkResult(items)
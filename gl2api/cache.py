@@ -0,0 +1,285 @@
+"""Response caches for the GET requests of the API.
+
+A cache is passed to the API and consulted for every GET on a resource that
+has a TTL configured. Entries are keyed by the resolved URL including the query
+parameters. When an entry expired and the server sent an ETag or Last-Modified
+header, it is revalidated with a conditional request and reused if the server
+answers with 304. Writes to a resource invalidate all its entries.
+
+    cache=ResponseCache(max_size=256, ttls=METADATA_TTLS)
+    api=API("http://localhost:9000/api", auth=auth, cache=cache)
+
+Cached results are shared between callers and must not be modified.
+
+A DiskCache keeps the loaded results in files, so a new process starts warm
+and skips the requests and the deserialization of static metadata. Its entries
+are stored per Graylog server version:
+
+    cache=DiskCache(os.path.expanduser("~/.cache/gl2api/prod"), ttls=DISK_TTLS)
+    api=API("http://localhost:9000/api", auth=auth, cache=cache)
+    cache.set_version(server_version(api))
+"""
+import errno
+import hashlib
+import os
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from .util import loggingFactory
+
+_getLogger=loggingFactory('cache')
+
+# resources that hardly ever change
+METADATA_TTLS={
+    'input_types': 3600,
+    'index_rotation_strategies': 3600,
+    'index_retention_strategies': 3600,
+    'stream_rule_types': 3600,
+}
+
+# the metadata only changes with the server version, which is checked separately
+DISK_TTLS={resource: 7*86400 for resource in METADATA_TTLS}
+
+
+class CacheEntry(object):
+
+    def __init__(self, resource, value, etag=None, last_modified=None, expires=0):
+        self.resource=resource
+        self.value=value
+        self.etag=etag
+        self.last_modified=last_modified
+        self.expires=expires
+
+    def is_fresh(self, now=None):
+        return (now or time.time())<self.expires
+
+    def can_revalidate(self):
+        return self.etag is not None or self.last_modified is not None
+
+    def __repr__(self):
+        return "CacheEntry(resource={}, etag={}, expires={})".format(self.resource, self.etag, self.expires)
+
+
+class ResponseCache(object):
+    """Thread safe LRU cache with per resource TTLs.
+
+    Resources listed in <ttls> are cached with their TTL in seconds, all others
+    with the default <ttl>. A TTL of None disables caching for a resource, so
+    by default only the resources in <ttls> are cached. If more than <max_size>
+    entries are stored, the least recently used ones are evicted.
+
+    Custom caches have to provide ttl_for(), lookup(), store(), refresh() and
+    invalidate().
+    """
+
+    def __init__(self, max_size=256, ttl=None, ttls=None):
+        self.max_size=max_size
+        self.ttl=ttl
+        self.ttls=dict(ttls or {})
+        self._entries=OrderedDict()
+        self._lock=threading.Lock()
+
+    def ttl_for(self, resource):
+        return self.ttls.get(resource, self.ttl)
+
+    def lookup(self, resource, key):
+        """Return the entry for key, fresh or expired, or None."""
+        with self._lock:
+            entry=self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key]=entry
+            return entry
+
+    def store(self, resource, key, value, etag=None, last_modified=None):
+        entry=CacheEntry(resource, value, etag, last_modified, time.time()+self.ttl_for(resource))
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key]=entry
+            while len(self._entries)>self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def refresh(self, key, entry):
+        """Extend the lifetime of a revalidated entry."""
+        entry.expires=time.time()+self.ttl_for(entry.resource)
+
+    def invalidate(self, resource=None):
+        """Drop all entries of <resource>, or all entries if no resource is given."""
+        with self._lock:
+            if resource is None:
+                self._entries.clear()
+            else:
+                for key in [k for (k, e) in self._entries.items() if e.resource==resource]:
+                    del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def server_version(api, timeout=None):
+    """Return the version of the Graylog server of api."""
+    r=api.session.get(api.root_url+'/system', timeout=timeout or api.timeout)
+    r.raise_for_status()
+    return r.json()['version']
+
+
+class DiskCache(object):
+    """Persistent cache, that pickles every entry into a file below <directory>.
+
+    The TTLs are configured like for ResponseCache. The entries are stored in a
+    sub directory of the server <version>, entries of other versions are never
+    used and removed by purge(). Loaded entries are also kept in memory. The
+    directory can be shared by several processes of the same user and cluster,
+    files are replaced atomically.
+
+    Loading a pickle can execute code, so the directories are created private
+    to the user. Directories, that are owned by another user or writable by
+    others, are refused with a ValueError, and such files aren't loaded.
+    """
+
+    SUFFIX='.cache'
+
+    def __init__(self, directory, version=None, ttl=None, ttls=None):
+        self.directory=directory
+        self.ttl=ttl
+        self.ttls=dict(ttls or {})
+        self._entries={}
+        self._lock=threading.Lock()
+        self.set_version(version)
+
+    @staticmethod
+    def _version_dir(version):
+        return re.sub(r'[^\w.-]', '_', version) if version is not None else 'unversioned'
+
+    def set_version(self, version):
+        """Use the entries of the server <version>."""
+        with self._lock:
+            self.version=version
+            self.path=os.path.join(self.directory, self._version_dir(version))
+            self._entries.clear()
+        try:
+            os.makedirs(self.path, 0o700)
+        except OSError as e:
+            if e.errno!=errno.EEXIST:
+                raise
+        for path in (self.directory, self.path):
+            if not self._is_private(os.stat(path)):
+                raise ValueError("Cache directory {} must be owned by the user and not writable by others".format(
+                    path))
+
+    @staticmethod
+    def _is_private(st):
+        """True if the file or directory is owned by the user and only writable by the user."""
+        if not hasattr(os, 'getuid'):
+            return True
+        return st.st_uid==os.getuid() and not st.st_mode & 0o022
+
+    def _file(self, resource, key):
+        # the resource prefix allows invalidating a resource without reading the files
+        return os.path.join(self.path, "{}-{}{}".format(resource, hashlib.sha1(key).hexdigest(), self.SUFFIX))
+
+    def _files(self, resource=None):
+        prefix=resource+'-' if resource is not None else ''
+        return [os.path.join(self.path, name) for name in os.listdir(self.path)
+                if name.startswith(prefix) and name.endswith(self.SUFFIX)]
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                if not self._is_private(os.fstat(f.fileno())):
+                    _getLogger('_read').warn("Not loading %s, it isn't private to the user", path)
+                    return None
+                return pickle.load(f)
+        except (IOError, OSError) as e:
+            if e.errno!=errno.ENOENT:
+                _getLogger('_read').warn("Failed to read %s: %s", path, e)
+        except Exception as e:
+            # e.g. truncated files or classes, that don't exist anymore
+            _getLogger('_read').warn("Dropping unreadable entry %s: %s", path, e)
+            self._remove(path)
+        return None
+
+    def _write(self, path, key, entry):
+        tmp="{}.{}.{}.tmp".format(path, os.getpid(), threading.current_thread().ident)
+        try:
+            with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'wb') as f:
+                pickle.dump((key, entry), f, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp, path)
+        except (IOError, OSError, pickle.PicklingError) as e:
+            # the entry is still cached in memory
+            _getLogger('_write').warn("Failed to write %s: %s", path, e)
+            self._remove(tmp)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            if e.errno!=errno.ENOENT:
+                raise
+
+    def ttl_for(self, resource):
+        return self.ttls.get(resource, self.ttl)
+
+    def lookup(self, resource, key):
+        """Return the entry for key, fresh or expired, or None."""
+        entry=self._entries.get(key)
+        if entry is None:
+            stored=self._read(self._file(resource, key))
+            # the file name is a hash, the key is compared to rule out collisions
+            if stored is not None and stored[0]==key:
+                entry=stored[1]
+                with self._lock:
+                    self._entries[key]=entry
+        return entry
+
+    def store(self, resource, key, value, etag=None, last_modified=None):
+        entry=CacheEntry(resource, value, etag, last_modified, time.time()+self.ttl_for(resource))
+        with self._lock:
+            self._entries[key]=entry
+        self._write(self._file(resource, key), key, entry)
+        return entry
+
+    def refresh(self, key, entry):
+        """Extend the lifetime of a revalidated entry."""
+        entry.expires=time.time()+self.ttl_for(entry.resource)
+        self._write(self._file(entry.resource, key), key, entry)
+
+    def invalidate(self, resource=None):
+        """Drop all entries of <resource>, or all entries if no resource is given."""
+        with self._lock:
+            if resource is None:
+                self._entries.clear()
+            else:
+                for key in [k for (k, e) in self._entries.items() if e.resource==resource]:
+                    del self._entries[key]
+        for path in self._files(resource):
+            self._remove(path)
+
+    def purge(self):
+        """Remove the expired entries and the entries of other server versions, return the number of files removed."""
+        removed=0
+        current=self._version_dir(self.version)
+        for name in os.listdir(self.directory):
+            path=os.path.join(self.directory, name)
+            if name!=current and os.path.isdir(path):
+                removed+=len([f for f in os.listdir(path) if f.endswith(self.SUFFIX)])
+                for f in os.listdir(path):
+                    self._remove(os.path.join(path, f))
+                os.rmdir(path)
+        now=time.time()
+        for path in self._files():
+            stored=self._read(path)
+            if stored is None or not stored[1].is_fresh(now):
+                with self._lock:
+                    if stored is not None:
+                        self._entries.pop(stored[0], None)
+                self._remove(path)
+                removed+=1
+        return removed
+
+    def __len__(self):
+        return len(self._files())
@@ -0,0 +1,156 @@
+"""Columnar representation of search results.
+
+Instead of creating a message object for every hit, the messages of a search
+response are pivoted into one array per field. Numeric fields become typed
+NumPy arrays, timestamps datetime64 arrays and strings are encoded as integer
+codes into a string pool, that is shared by all string columns of the result.
+
+    res=api.absolute_search.list(query_params=params, columnar=['timestamp', 'source', 'level'])
+    res['level'].mean()
+    res['source'].decode()
+"""
+from collections import OrderedDict
+from numbers import Number
+
+# numpy is imported on first use, it takes longer to import than the rest of the package
+np=None
+
+TIMESTAMP_FIELDS=('timestamp',)
+
+
+def _import_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("Columnar results require the numpy package")
+        np=numpy
+    return np
+
+
+class StringPool(object):
+    """Interned list of strings, that are referenced by their index."""
+
+    def __init__(self):
+        self.values=[]
+        self._index={}
+
+    def code(self, value):
+        try:
+            return self._index[value]
+        except KeyError:
+            self._index[value]=len(self.values)
+            self.values.append(value)
+            return len(self.values)-1
+
+    def __len__(self):
+        return len(self.values)
+
+
+class StringColumn(object):
+    """Column of strings, stored as int32 codes into a StringPool. Missing values have the code -1."""
+
+    def __init__(self, codes, pool):
+        self.codes=codes
+        self.pool=pool
+
+    def decode(self):
+        """Return the column as object array of strings, with None for missing values."""
+        values=np.array(self.pool.values+[None], dtype=object)
+        return values[self.codes]
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        code=self.codes[i]
+        return None if code<0 else self.pool.values[code]
+
+    def __repr__(self):
+        return "StringColumn(len={}, pool={})".format(len(self.codes), len(self.pool))
+
+
+class ColumnarResults(object):
+    """Search results with one column per message field."""
+
+    def __init__(self, columns, total_results=None, query=None, time=None, _from=None, to=None):
+        self.columns=columns
+        self.total_results=total_results
+        self.query=query
+        self.time=time
+        self._from=_from
+        self.to=to
+
+    @property
+    def message_fields(self):
+        return list(self.columns.keys())
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __len__(self):
+        for column in self.columns.values():
+            return len(column)
+        return 0
+
+    def __repr__(self):
+        return "ColumnarResults(rows={}, total_results={}, fields={})".format(
+            len(self), self.total_results, sorted(self.columns.keys()))
+
+
+def _timestamp_column(values):
+    return np.array(
+        ['NaT' if v is None else v.rstrip('Z') for v in values],
+        dtype='datetime64[ms]')
+
+
+def _numeric_column(values):
+    if all(isinstance(v, (int, long)) for v in values):
+        return np.array(values, dtype=np.int64)
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def _string_column(values, pool):
+    codes=np.empty(len(values), dtype=np.int32)
+    for (i, v) in enumerate(values):
+        codes[i]=-1 if v is None else pool.code(v)
+    return StringColumn(codes, pool)
+
+
+def make_column(name, values, pool):
+    """Convert the list of raw values of field <name> into the best matching column type."""
+    _import_numpy()
+    present=[v for v in values if v is not None]
+    if name in TIMESTAMP_FIELDS and all(isinstance(v, basestring) for v in present):
+        return _timestamp_column(values)
+    if present and all(isinstance(v, Number) and not isinstance(v, bool) for v in present):
+        return _numeric_column(values)
+    if all(isinstance(v, basestring) for v in present):
+        return _string_column(values, pool)
+    return np.array(values, dtype=object)
+
+
+def load_columnar(data, columns=None):
+    """Build ColumnarResults from a raw search response.
+
+    The columns default to the message fields of the response.
+    """
+    _import_numpy()
+
+    hits=data.get('messages') or []
+    if columns is None:
+        columns=data.get('fields') or []
+
+    messages=[hit.get('message') or {} for hit in hits]
+    pool=StringPool()
+    return ColumnarResults(
+        OrderedDict((name, make_column(name, [m.get(name) for m in messages], pool)) for name in columns),
+        total_results=data.get('total_results'),
+        query=data.get('query'),
+        time=data.get('time'),
+        _from=data.get('from'),
+        to=data.get('to'))
@@ -0,0 +1,193 @@
+"""Concurrent execution of searches over large time ranges.
+
+A single search over a long time range either times out or runs into the
+result window of Elasticsearch. The SearchExecutor splits the range [from, to]
+of an absolute search into time slices, that are searched concurrently on a
+bounded pool. Slices with more than <max_slice_results> hits are subdivided.
+
+    executor=SearchExecutor(api, slice_size=timedelta(hours=6), concurrency=4)
+    results=executor.search({'query': 'level:<=3', 'from': '2018-07-01T00:00:00.000Z',
+                              'to': '2018-07-08T00:00:00.000Z'})
+    for msg in results:
+        print(msg.message.timestamp, msg.message.source)
+    print(results.total_results)
+
+Every slice ends one millisecond before the next one starts, see
+gl2api.util.time_slices, so the slices don't overlap although Graylog includes
+both ends of a range. Every slice is searched sorted by timestamp, and the
+messages are merged into timestamp order by returning the slices in time
+order. Only the slices of the running window are held in memory.
+"""
+from collections import deque
+from datetime import timedelta
+from multiprocessing.pool import ThreadPool
+
+from .util import loggingFactory, parse_timestamp, time_slices
+
+_getLogger=loggingFactory('executor')
+
+# the default index.max_result_window of Elasticsearch
+MAX_RESULT_WINDOW=10000
+
+
+class SliceResult(object):
+    """Outcome of the search of one slice, either its messages or the subslices to search instead."""
+
+    def __init__(self, _from, to, total=None, messages=None, subslices=None, truncated=False):
+        self._from=_from
+        self.to=to
+        self.total=total
+        self.messages=messages
+        self.subslices=subslices
+        self.truncated=truncated
+
+    def __repr__(self):
+        return "SliceResult(from={}, to={}, total={})".format(self._from, self.to, self.total)
+
+
+class SlicedSearch(object):
+    """Iterable over the messages of a sliced search, in timestamp order.
+
+    total_results and slices grow while the messages are consumed and are
+    complete after the iteration.
+    """
+
+    def __init__(self, executor, query_params):
+        self.executor=executor
+        self.query_params=query_params
+        self.total_results=0
+        self.slices=[]
+        self.truncated=False
+
+    def __iter__(self):
+        return self.executor._generate(self)
+
+    def __repr__(self):
+        return "SlicedSearch(slices={}, total_results={})".format(len(self.slices), self.total_results)
+
+
+class SearchExecutor(object):
+    """Runs absolute searches as concurrent time slices.
+
+    The range is initially split into slices of <slice_size> (timedelta or
+    seconds). A slice with more hits than <max_slice_results> is split into
+    as many equal parts as needed, down to <min_slice_size>. Up to
+    <concurrency> slices are searched at the same time and each is paged with
+    <page_size>. The messages can be restricted to the given <fields>.
+    """
+
+    def __init__(self, api, resource='absolute_search', slice_size=timedelta(hours=1),
+                 min_slice_size=timedelta(seconds=1), max_slice_results=MAX_RESULT_WINDOW, page_size=1000,
+                 concurrency=None, descending=False, timeout=None, fields=None):
+        self.api=api
+        self.resource=resource
+        self.slice_size=slice_size
+        self.min_slice_size=min_slice_size if isinstance(min_slice_size, timedelta) else \
+            timedelta(seconds=min_slice_size)
+        self.max_slice_results=max_slice_results
+        self.page_size=min(page_size, max_slice_results)
+        self.concurrency=concurrency or api.pool_size
+        self.descending=descending
+        self.timeout=timeout
+        self.fields=fields
+
+    def _list(self, query_params):
+        kwargs={'timeout': self.timeout} if self.timeout is not None else {}
+        if self.fields:
+            kwargs['fields']=self.fields
+        return getattr(self.api, self.resource).list(query_params=query_params, **kwargs)
+
+    def _params(self, query_params, _from, to, offset, limit):
+        params=dict(query_params, offset=offset, limit=limit)
+        params['from']=_from
+        params['to']=to
+        params.setdefault('sort', 'timestamp:desc' if self.descending else 'timestamp:asc')
+        return params
+
+    def _split(self, _from, to, total):
+        """Return the subslices of a dense slice, or None if it can't be split any more."""
+        start, end=parse_timestamp(_from), parse_timestamp(to)
+        parts=max(2, -(-total//self.max_slice_results))
+        size=max((end-start)//parts, self.min_slice_size)
+        if size>=end-start:
+            return None
+        return time_slices(_from, to, size)
+
+    def _run_slice(self, query_params, _from, to):
+        """Search the slice [_from, to] and return a SliceResult."""
+        res=self._list(self._params(query_params, _from, to, 0, self.page_size))
+        messages=list(res.messages)
+        total=getattr(res, 'total_results', None)
+        if total is None:
+            total=len(messages)
+
+        truncated=False
+        if total>self.max_slice_results:
+            subslices=self._split(_from, to, total)
+            if subslices is not None:
+                return SliceResult(_from, to, total, subslices=subslices)
+            _getLogger('_run_slice').warn("Slice %s - %s has %d results, only %d are returned",
+                                          _from, to, total, self.max_slice_results)
+            truncated=True
+
+        limit=min(total, self.max_slice_results)
+        while len(messages)<limit:
+            page=self._list(self._params(query_params, _from, to, len(messages),
+                                         min(self.page_size, limit-len(messages)))).messages
+            if not page:
+                break
+            messages.extend(page)
+        return SliceResult(_from, to, total, messages=messages, truncated=truncated)
+
+    def _initial_slices(self, query_params):
+        if 'from' not in query_params or 'to' not in query_params:
+            raise ValueError("Sliced searches require from and to query parameters")
+        slices=time_slices(query_params['from'], query_params['to'], self.slice_size)
+        return slices[::-1] if self.descending else slices
+
+    def _generate(self, search):
+        query_params=search.query_params
+        # entries of [from, to, AsyncResult], in the order of the output
+        queue=deque([_from, to, None] for (_from, to) in self._initial_slices(query_params))
+        window=2*self.concurrency
+        pool=ThreadPool(self.concurrency)
+        try:
+            while queue:
+                for (i, entry) in enumerate(queue):
+                    if i>=window:
+                        break
+                    if entry[2] is None:
+                        entry[2]=pool.apply_async(self._run_slice, (query_params, entry[0], entry[1]))
+
+                result=queue.popleft()[2].get()
+                if result.subslices is not None:
+                    _getLogger('_generate').debug("Splitting %s into %d slices", result, len(result.subslices))
+                    subslices=result.subslices[::-1] if self.descending else result.subslices
+                    queue.extendleft([_from, to, None] for (_from, to) in reversed(subslices))
+                    continue
+
+                search.total_results+=result.total
+                search.truncated=search.truncated or result.truncated
+                search.slices.append((result._from, result.to, result.total))
+                for msg in result.messages:
+                    yield msg
+        finally:
+            pool.terminate()
+
+    def search(self, query_params):
+        """Return a SlicedSearch over the messages of the absolute search with <query_params>."""
+        query_params=dict(query_params)
+        self._initial_slices(query_params)
+        return SlicedSearch(self, query_params)
+
+    def count(self, query_params):
+        """Return the total number of results, counted concurrently per slice without fetching messages."""
+        query_params=dict(query_params)
+        slices=self._initial_slices(query_params)
+        pool=ThreadPool(max(1, min(len(slices), self.concurrency)))
+        try:
+            results=pool.map(lambda s: self._list(self._params(query_params, s[0], s[1], 0, 1)), slices)
+        finally:
+            pool.close()
+            pool.join()
+        return sum(getattr(res, 'total_results', None) or 0 for res in results)
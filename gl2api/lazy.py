@@ -0,0 +1,58 @@
+"""Lazily deserialised list() results.
+
+With lazy=True the list method of a collection keeps the decoded JSON of the
+elements and runs the schema load for an element only when it is accessed.
+Single attributes of all elements can be read without loading the objects:
+
+    streams=api.streams.list(lazy=True)
+    titles=streams.values('title')
+    stream=streams[titles.index('App')]
+"""
+from marshmallow import missing
+
+_UNLOADED=object()
+
+
+class LazyList(object):
+    """Sequence of objects, that are loaded with <load> from the raw <items> on first access."""
+
+    def __init__(self, items, load, schema):
+        self._items=items
+        self._objs=[_UNLOADED]*len(items)
+        self._load=load
+        self._schema=schema
+
+    def _get(self, i):
+        obj=self._objs[i]
+        if obj is _UNLOADED:
+            obj=self._objs[i]=self._load(self._items[i])
+        return obj
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._get(j) for j in xrange(*i.indices(len(self._items)))]
+        return self._get(i)
+
+    def __iter__(self):
+        for i in xrange(len(self._items)):
+            yield self._get(i)
+
+    def raw(self, i):
+        """Return the decoded JSON of the element <i>."""
+        return self._items[i]
+
+    def values(self, name):
+        """Return the attribute <name> of all elements, deserialised by its schema field only."""
+        field=self._schema.fields[name]
+        key=field.load_from or name
+        return [field.deserialize(item.get(key, missing)) for item in self._items]
+
+    def loaded(self):
+        """Return the number of elements, that have been deserialised."""
+        return sum(1 for obj in self._objs if obj is not _UNLOADED)
+
+    def __repr__(self):
+        return "LazyList(len={}, loaded={})".format(len(self._items), self.loaded())
@@ -0,0 +1,232 @@
+"""Per endpoint metrics of the API requests.
+
+The API reports every HTTP request and every deserialisation of a response
+to the sinks of its Metrics, keyed by resource and method name. A sink is any
+callable taking the event dict, e.g. a MemorySink, that aggregates the events
+and renders them as summary or in the Prometheus text format:
+
+    sink=MemorySink()
+    api=API("http://localhost:9000/api", auth=auth, metrics=Metrics(sink, lambda event: log(event)))
+    ...
+    sink.summary()[('streams', 'list')]
+    open('gl2api.prom', 'w').write(sink.prometheus())
+
+Events of kind "request" have the http_method, status, seconds (network time
+including retries), retries and the sizes of the response and request bodies:
+bytes and request_bytes uncompressed, wire_bytes and request_wire_bytes as
+transferred. Events of kind "load" have the seconds spent deserialising the
+response. Without metrics the API only checks for
+None, so the instrumentation costs nothing when disabled.
+"""
+import threading
+import time
+
+from .util import loggingFactory
+
+_getLogger=loggingFactory('metrics')
+
+# the default buckets of the Prometheus client libraries
+DEFAULT_BUCKETS=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metrics(object):
+    """Dispatches the events of the API to the <sinks>."""
+
+    def __init__(self, *sinks):
+        self.sinks=list(sinks)
+
+    def _emit(self, event):
+        for sink in self.sinks:
+            try:
+                sink(event)
+            except Exception as e:
+                _getLogger('_emit').warn("Metrics sink %s failed: %s", sink, e)
+
+    def request(self, method_info, http_method, r, seconds, retries, stream=False, sent=(0, 0)):
+        """Report the response <r> of a request, that took <seconds> with <retries>.
+
+        <sent> are the uncompressed and transferred sizes of the request body.
+        The body of streamed responses isn't read yet, only its transferred size
+        is taken from the Content-Length header, if any.
+        """
+        if stream:
+            size=None
+            wire_size=int(r.headers['Content-Length']) if 'Content-Length' in r.headers else None
+        else:
+            size=len(r.content)
+            # the raw response counts the bytes read from the connection
+            tell=getattr(r.raw, 'tell', None)
+            wire_size=tell() if tell is not None else size
+        self._emit({
+            'kind': 'request',
+            'time': time.time(),
+            'resource': method_info.get('resource'),
+            'method': method_info.get('name'),
+            'http_method': http_method,
+            'status': r.status_code,
+            'seconds': seconds,
+            'bytes': size,
+            'wire_bytes': wire_size,
+            'request_bytes': sent[0],
+            'request_wire_bytes': sent[1],
+            'retries': retries,
+        })
+
+    def load(self, method_info, seconds):
+        """Report the deserialisation of a response, that took <seconds>."""
+        self._emit({
+            'kind': 'load',
+            'time': time.time(),
+            'resource': method_info.get('resource'),
+            'method': method_info.get('name'),
+            'seconds': seconds,
+        })
+
+
+class Histogram(object):
+    """Counts of the observed values per bucket, with their sum and maximum."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets=tuple(buckets)
+        self.counts=[0]*(len(self.buckets)+1)
+        self.count=0
+        self.sum=0.0
+        self.max=0.0
+
+    def observe(self, value):
+        i=0
+        while i<len(self.buckets) and value>self.buckets[i]:
+            i+=1
+        self.counts[i]+=1
+        self.count+=1
+        self.sum+=value
+        self.max=max(self.max, value)
+
+    def cumulative(self):
+        """Return (upper bound, count of values <= bound) pairs, the last bound is +Inf."""
+        ret=[]
+        total=0
+        for (bound, count) in zip(self.buckets+(float('inf'),), self.counts):
+            total+=count
+            ret.append((bound, total))
+        return ret
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum/self.count if self.count else None,
+            'max': self.max,
+        }
+
+
+class EndpointStats(object):
+    """Aggregated events of one resource method."""
+
+    def __init__(self, buckets):
+        self.requests=0
+        self.status_codes={}
+        self.bytes=0
+        self.wire_bytes=0
+        self.request_bytes=0
+        self.request_wire_bytes=0
+        self.retries=0
+        self.network=Histogram(buckets)
+        self.load=Histogram(buckets)
+
+    def summary(self):
+        return {
+            'requests': self.requests,
+            'status_codes': dict(self.status_codes),
+            'bytes': self.bytes,
+            'wire_bytes': self.wire_bytes,
+            'request_bytes': self.request_bytes,
+            'request_wire_bytes': self.request_wire_bytes,
+            'retries': self.retries,
+            'network_seconds': self.network.summary(),
+            'load_seconds': self.load.summary(),
+        }
+
+
+def _labels(**labels):
+    return ",".join('{}="{}"'.format(k, str(v).replace('\\', r'\\').replace('"', r'\"'))
+                    for (k, v) in sorted(labels.items()))
+
+
+class MemorySink(object):
+    """Sink, that aggregates the events per (resource, method) in memory."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets=buckets
+        self._stats={}
+        self._lock=threading.Lock()
+
+    def __call__(self, event):
+        key=(event['resource'], event['method'])
+        with self._lock:
+            stats=self._stats.get(key)
+            if stats is None:
+                stats=self._stats[key]=EndpointStats(self.buckets)
+            if event['kind']=='request':
+                stats.requests+=1
+                stats.status_codes[event['status']]=stats.status_codes.get(event['status'], 0)+1
+                stats.bytes+=event['bytes'] or 0
+                stats.wire_bytes+=event['wire_bytes'] or 0
+                stats.request_bytes+=event['request_bytes']
+                stats.request_wire_bytes+=event['request_wire_bytes']
+                stats.retries+=event['retries']
+                stats.network.observe(event['seconds'])
+            else:
+                stats.load.observe(event['seconds'])
+
+    def reset(self):
+        with self._lock:
+            self._stats={}
+
+    def summary(self):
+        """Return the aggregated stats as {(resource, method): dict}."""
+        with self._lock:
+            return {key: stats.summary() for (key, stats) in self._stats.items()}
+
+    def prometheus(self, prefix='gl2api'):
+        """Render the aggregated stats in the Prometheus text exposition format."""
+        with self._lock:
+            stats=sorted(self._stats.items())
+            lines=[]
+
+            def metric(name, kind, help_text):
+                lines.append("# HELP {}_{} {}".format(prefix, name, help_text))
+                lines.append("# TYPE {}_{} {}".format(prefix, name, kind))
+
+            metric('requests_total', 'counter', "Requests by resource, method and status code.")
+            for ((resource, method), s) in stats:
+                for (status, count) in sorted(s.status_codes.items()):
+                    lines.append("{}_requests_total{{{}}} {}".format(
+                        prefix, _labels(resource=resource, method=method, status=status), count))
+            for (name, attr, help_text) in (
+                    ('response_bytes_total', 'bytes', "Uncompressed bytes of the response bodies."),
+                    ('response_wire_bytes_total', 'wire_bytes', "Transferred bytes of the response bodies."),
+                    ('request_bytes_total', 'request_bytes', "Uncompressed bytes of the request bodies."),
+                    ('request_wire_bytes_total', 'request_wire_bytes', "Transferred bytes of the request bodies.")):
+                metric(name, 'counter', help_text)
+                for ((resource, method), s) in stats:
+                    lines.append("{}_{}{{{}}} {}".format(
+                        prefix, name, _labels(resource=resource, method=method), getattr(s, attr)))
+            metric('retries_total', 'counter', "Retried requests.")
+            for ((resource, method), s) in stats:
+                lines.append("{}_retries_total{{{}}} {}".format(
+                    prefix, _labels(resource=resource, method=method), s.retries))
+
+            for (name, attr, help_text) in (('request_seconds', 'network', "Network time of the requests."),
+                                            ('load_seconds', 'load', "Deserialisation time of the responses.")):
+                metric(name, 'histogram', help_text)
+                for ((resource, method), s) in stats:
+                    histogram=getattr(s, attr)
+                    for (bound, count) in histogram.cumulative():
+                        lines.append("{}_{}_bucket{{{}}} {}".format(prefix, name, _labels(
+                            resource=resource, method=method, le='+Inf' if bound==float('inf') else repr(bound)),
+                            count))
+                    labels=_labels(resource=resource, method=method)
+                    lines.append("{}_{}_sum{{{}}} {!r}".format(prefix, name, labels, histogram.sum))
+                    lines.append("{}_{}_count{{{}}} {}".format(prefix, name, labels, histogram.count))
+        return "\n".join(lines)+"\n"
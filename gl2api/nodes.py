@@ -0,0 +1,187 @@
+"""Load balancing and failover over the nodes of a Graylog cluster.
+
+The API sends every request to a node chosen by its NodePool. Reads are
+distributed round-robin or to the node with the lowest latency, writes can be
+pinned to the master node. A node is ejected after <max_failures> consecutive
+connection errors or 502/503/504 responses; the retry policy then repeats the
+request on another node. After <eject_time> seconds an ejected node receives
+requests again and is restored by the first success. The attempt after a
+failure avoids the failed node, if another one is available. probe() checks
+the load balancer status of all nodes actively.
+
+    api=API(["http://gl1:9000/api", "http://gl2:9000/api", "http://gl3:9000/api"], auth=auth,
+            strategy='least_latency', pin_writes=True)
+"""
+import threading
+import time
+
+import requests.exceptions
+
+from .util import loggingFactory
+
+_getLogger=loggingFactory('nodes')
+
+FAILURE_STATUS_CODES=(502, 503, 504)
+
+
+class Node(object):
+    """A node of the cluster, with its health and latency."""
+
+    def __init__(self, url):
+        self.url=url.rstrip('/')
+        self.failures=0
+        self.ejected_until=None
+        self.latency=None
+        self.requests=0
+        self.is_master=None
+
+    def is_available(self, now):
+        return self.ejected_until is None or self.ejected_until<=now
+
+    def __repr__(self):
+        return "Node(url={}, latency={}, ejected={})".format(self.url, self.latency, self.ejected_until is not None)
+
+
+class NodePool(object):
+    """Chooses the node of every request and keeps track of the health of the nodes.
+
+    <strategy> is 'round_robin' or 'least_latency', the latency is the moving
+    average of the response times with <latency_weight> for the last one.
+    With <pin_writes>, writes go to the master node, which is <master> or
+    discovered by the first write.
+    """
+
+    STRATEGIES=('round_robin', 'least_latency')
+
+    def __init__(self, urls, strategy='round_robin', max_failures=3, eject_time=30.0, pin_writes=False, master=None,
+                 latency_weight=0.3):
+        if isinstance(urls, basestring):
+            urls=[urls]
+        if not urls:
+            raise ValueError("At least one node URL is required")
+        if strategy not in self.STRATEGIES:
+            raise ValueError("Invalid strategy: {}".format(strategy))
+        self.nodes=[Node(url) for url in urls]
+        self.strategy=strategy
+        self.max_failures=max_failures
+        self.eject_time=eject_time
+        self.pin_writes=pin_writes
+        self.latency_weight=latency_weight
+        self.master=None
+        if master is not None:
+            self.master=self._node(master)
+            self.master.is_master=True
+        self._next=0
+        self._lock=threading.Lock()
+        # the node that failed the last request of the thread
+        self._local=threading.local()
+
+    def _node(self, url):
+        for node in self.nodes:
+            if node.url==url.rstrip('/'):
+                return node
+        raise ValueError("Unknown node: {}".format(url))
+
+    def available(self):
+        """Return the nodes, that aren't ejected."""
+        now=time.time()
+        return [node for node in self.nodes if node.is_available(now)]
+
+    def pick(self, write=False, exclude=None):
+        """Return the node for the next request.
+
+        The node <exclude> is only returned, if no other node is available. If
+        all nodes are ejected, the one that is ejected the longest is tried.
+        """
+        if write and self.pin_writes and self.master is not None:
+            return self.master
+        with self._lock:
+            nodes=self.available()
+            others=[node for node in (nodes or self.nodes) if node is not exclude]
+            if not nodes:
+                return min(others or self.nodes, key=lambda node: node.ejected_until)
+            nodes=others or nodes
+            if len(nodes)==1:
+                return nodes[0]
+            if self.strategy=='least_latency':
+                # nodes without measurements are tried first
+                return min(nodes, key=lambda node: node.latency or 0.0)
+            self._next+=1
+            return nodes[self._next % len(nodes)]
+
+    def succeeded(self, node, seconds):
+        with self._lock:
+            if node.ejected_until is not None:
+                _getLogger('succeeded').info("Node %s is available again", node.url)
+            node.failures=0
+            node.ejected_until=None
+            node.requests+=1
+            node.latency=seconds if node.latency is None else \
+                self.latency_weight*seconds+(1-self.latency_weight)*node.latency
+
+    def failed(self, node):
+        with self._lock:
+            node.failures+=1
+            node.requests+=1
+            if node.failures>=self.max_failures or node.ejected_until is not None:
+                if node.ejected_until is None or node.ejected_until<=time.time():
+                    _getLogger('failed').warn("Ejecting node %s for %.1fs", node.url, self.eject_time)
+                node.ejected_until=time.time()+self.eject_time
+
+    def send(self, session, method, path, write=False, **kwargs):
+        """Send the request for <path> to the next node and record the outcome.
+
+        A retry of a failed request is sent to another node, if one is available.
+        """
+        node=self.pick(write, getattr(self._local, 'failed', None))
+        start=time.time()
+        try:
+            r=getattr(session, method.lower())(node.url+'/'+path, **kwargs)
+        except requests.exceptions.ConnectionError:
+            self._local.failed=node
+            self.failed(node)
+            raise
+        if r.status_code in FAILURE_STATUS_CODES:
+            self._local.failed=node
+            self.failed(node)
+        else:
+            self._local.failed=None
+            self.succeeded(node, time.time()-start)
+        return r
+
+    def discover_master(self, session, timeout=5):
+        """Find the master node with the system overview of the available nodes."""
+        for node in self.available() or self.nodes:
+            try:
+                r=session.get(node.url+'/system', timeout=timeout)
+            except requests.exceptions.RequestException as e:
+                _getLogger('discover_master').warn("Node %s failed: %s", node.url, e)
+                continue
+            if r.status_code==200:
+                node.is_master=bool(r.json().get('is_master'))
+                if node.is_master:
+                    self.master=node
+                    return node
+        return None
+
+    def probe(self, session, timeout=5):
+        """Check the load balancer status of all nodes, eject dead nodes and restore alive ones."""
+        for node in self.nodes:
+            try:
+                r=session.get(node.url+'/system/lbstatus', timeout=timeout, headers={'Accept': 'text/plain'})
+                alive=r.status_code==200 and r.text.strip().upper()=='ALIVE'
+            except requests.exceptions.RequestException:
+                alive=False
+            with self._lock:
+                if alive:
+                    node.failures=0
+                    node.ejected_until=None
+                else:
+                    node.ejected_until=time.time()+self.eject_time
+        return self.available()
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __repr__(self):
+        return "NodePool(nodes={}, strategy={})".format(self.nodes, self.strategy)
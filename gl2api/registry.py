@@ -0,0 +1,70 @@
+"""Registry of named API instances.
+
+A process can talk to several Graylog clusters, or to one cluster with
+different credentials, by registering one API per name. Every API has its own
+connection pool, cache and retry policy. Lookups of registered APIs don't lock,
+only the creation is serialised, so concurrent first calls create one API:
+
+    registry=ApiRegistry(create_api)
+    prod=registry.get_or_create('prod', "http://prod:9000/api", auth=prod_auth)
+    test=registry.get_or_create('test', ["http://test1:9000/api", "http://test2:9000/api"], auth=test_auth)
+    get_stream_by_name("App", api=registry.get('prod'))
+"""
+import threading
+
+
+class ApiRegistry(object):
+    """Thread-safe map of names to API instances, that are created with <factory>."""
+
+    def __init__(self, factory):
+        self.factory=factory
+        self._apis={}
+        self._lock=threading.Lock()
+
+    def get(self, name):
+        """Return the API registered as <name>, or None."""
+        return self._apis.get(name)
+
+    def get_or_create(self, name, *args, **kwargs):
+        """Return the API <name>, it is created with factory(*args, **kwargs) on first use."""
+        api=self._apis.get(name)
+        if api is not None:
+            return api
+        with self._lock:
+            api=self._apis.get(name)
+            if api is None:
+                api=self.factory(*args, **kwargs)
+                self._apis[name]=api
+        return api
+
+    def register(self, name, api):
+        """Register an existing API as <name>, a previously registered API is closed."""
+        with self._lock:
+            old=self._apis.get(name)
+            self._apis[name]=api
+        if old is not None and old is not api:
+            old.close()
+        return api
+
+    def remove(self, name):
+        """Remove and close the API <name>."""
+        with self._lock:
+            api=self._apis.pop(name, None)
+        if api is not None:
+            api.close()
+
+    def close(self):
+        """Remove and close all APIs."""
+        with self._lock:
+            apis, self._apis=self._apis, {}
+        for api in apis.values():
+            api.close()
+
+    def names(self):
+        return sorted(self._apis.keys())
+
+    def __contains__(self, name):
+        return name in self._apis
+
+    def __len__(self):
+        return len(self._apis)
@@ -0,0 +1,164 @@
+"""Retry policy for the requests of the API.
+
+Failed requests are retried with exponential backoff and full jitter.
+Connection errors are retried for all methods, error status codes like 503
+only for idempotent methods. A Retry-After header of the response is honoured.
+A retry budget limits the retries to a fraction of the requests, so a degraded
+server isn't hammered by all clients at once.
+
+    policy=RetryPolicy(max_attempts=5, backoff=0.5, budget=RetryBudget(ratio=0.2))
+    api=API("http://localhost:9000/api", auth=auth, retry=policy)
+    ...
+    policy.stats()
+"""
+import random
+import threading
+import time
+from email.utils import parsedate_tz, mktime_tz
+
+import requests.exceptions
+
+from .util import loggingFactory
+
+_getLogger=loggingFactory('retry')
+
+
+class RetryBudget(object):
+    """Token bucket, that allows retries for a fraction of the requests.
+
+    Every request deposits <ratio> tokens and every retry withdraws one. The
+    bucket starts with, and never holds more than, <max_tokens> tokens.
+    """
+
+    def __init__(self, ratio=0.1, max_tokens=10):
+        self.ratio=ratio
+        self.max_tokens=max_tokens
+        self.tokens=float(max_tokens)
+        self._lock=threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens=min(self.max_tokens, self.tokens+self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self.tokens>=1:
+                self.tokens-=1
+                return True
+            return False
+
+
+class RetryPolicy(object):
+    """Decides if and when a failed request is retried and counts the retries."""
+
+    IDEMPOTENT_METHODS=('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+    def __init__(self, max_attempts=3, backoff=1.0, max_backoff=30.0, jitter=True,
+                 status_codes=(429, 502, 503, 504), budget=None, respect_retry_after=True):
+        self.max_attempts=max_attempts
+        self.backoff=backoff
+        self.max_backoff=max_backoff
+        self.jitter=jitter
+        self.status_codes=frozenset(status_codes)
+        self.budget=budget
+        self.respect_retry_after=respect_retry_after
+        self._lock=threading.Lock()
+        self._local=threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests=0
+            self.retries=0
+            self.wait_time=0.0
+            self.budget_exhausted=0
+            self.failures=0
+
+    def stats(self):
+        """Return the counters of requests, retries and the time spent waiting for retries."""
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'retries': self.retries,
+                'wait_time': self.wait_time,
+                'budget_exhausted': self.budget_exhausted,
+                'failures': self.failures,
+            }
+
+    def last_attempts(self):
+        """Return the number of attempts of the last call in the current thread."""
+        return getattr(self._local, 'attempts', 0)
+
+    def delay(self, attempt, retry_after=None):
+        """Return the seconds to wait before the next attempt, after <attempt> failed attempts."""
+        delay=min(self.max_backoff, self.backoff*(2**(attempt-1)))
+        if self.jitter:
+            delay=random.uniform(0, delay)
+        if retry_after is not None:
+            delay=max(delay, min(retry_after, self.max_backoff))
+        return delay
+
+    @staticmethod
+    def retry_after(r):
+        """Return the Retry-After header of the response in seconds, or None."""
+        value=r.headers.get('Retry-After')
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            parsed=parsedate_tz(value)
+            return max(0.0, mktime_tz(parsed)-time.time()) if parsed is not None else None
+
+    def _may_retry(self, attempt):
+        if attempt>=self.max_attempts:
+            return False
+        if self.budget is not None and not self.budget.withdraw():
+            with self._lock:
+                self.budget_exhausted+=1
+            return False
+        return True
+
+    def _wait(self, delay):
+        with self._lock:
+            self.retries+=1
+            self.wait_time+=delay
+        time.sleep(delay)
+
+    def call(self, method, m, *args, **kwargs):
+        """Call m(*args, **kwargs) for the HTTP <method> and retry it according to the policy.
+
+        Returns the response. If all attempts fail with a connection error, the
+        last error is raised; the last response with a retryable status code is
+        returned.
+        """
+        with self._lock:
+            self.requests+=1
+        if self.budget is not None:
+            self.budget.deposit()
+
+        attempt=0
+        while True:
+            attempt+=1
+            self._local.attempts=attempt
+            try:
+                r=m(*args, **kwargs)
+            except requests.exceptions.ConnectionError:
+                if not self._may_retry(attempt):
+                    _getLogger('call').error('Unable to connect after %d attempts', attempt)
+                    with self._lock:
+                        self.failures+=1
+                    raise
+                delay=self.delay(attempt)
+                _getLogger('call').warn('Connection error, retrying in %.1fs', delay)
+            else:
+                if r.status_code not in self.status_codes or method not in self.IDEMPOTENT_METHODS:
+                    return r
+                if not self._may_retry(attempt):
+                    with self._lock:
+                        self.failures+=1
+                    return r
+                delay=self.delay(attempt, self.retry_after(r) if self.respect_retry_after else None)
+                _getLogger('call').warn('Status code %d, retrying in %.1fs', r.status_code, delay)
+                r.close()
+            self._wait(delay)
@@ -1,5 +1,12 @@
+import threading
+import time
 from . import get_api
 
+INDEX_TTL=60
+
+# serialises the creation of the indexes, the lookups don't lock
+_index_lock=threading.Lock()
+
 
 class ObjectNotFound(Exception):
     """Exception when a graylog object can't be found."""
@@ -13,19 +20,128 @@ class ObjectNotFound(Exception):
             super(ObjectNotFound, self).__init__("{} not found".format(type))
 
 
+class DuplicateObjectName(Exception):
+    """Exception when more than one graylog object has the requested name."""
+
+    def __init__(self, type, name, objects):
+        super(DuplicateObjectName, self).__init__("{} {} objects with name {} found: {}".format(
+            len(objects), type, name, ", ".join(str(getattr(o, 'id', o)) for o in objects)))
+        self.objects=objects
+
+
+class ObjectIndex(object):
+    """Index of the objects returned by list_api.list() by title and id.
+
+    The index is built with a single list() call and rebuilt on refresh(), or
+    on the next lookup after <ttl> seconds or after invalidate(). Writes through
+    the API invalidate the index of their resource. A lookup of an unknown name
+    or id refreshes the index once, before ObjectNotFound is raised, so objects
+    created elsewhere after the index was built are found as well.
+    """
+
+    def __init__(self, list_api, object_name, ttl=None, **list_kwargs):
+        self.list_api=list_api
+        self.object_name=object_name
+        self.ttl=ttl
+        self.list_kwargs=list_kwargs
+        self.by_title={}
+        self.by_id={}
+        self._built=None
+        self._lock=threading.Lock()
+
+    def refresh(self):
+        by_title, by_id={}, {}
+        for obj in self.list_api.list(**self.list_kwargs):
+            by_title.setdefault(getattr(obj, 'title', None), []).append(obj)
+            if getattr(obj, 'id', None) is not None:
+                by_id[obj.id]=obj
+        with self._lock:
+            self.by_title, self.by_id, self._built=by_title, by_id, time.time()
+
+    def invalidate(self):
+        """Rebuild the index on the next lookup."""
+        with self._lock:
+            self._built=None
+
+    def _ensure(self):
+        """Build the index if missing or expired, returns True if it was rebuilt."""
+        if self._built is None or (self.ttl is not None and time.time()-self._built>=self.ttl):
+            self.refresh()
+            return True
+        return False
+
+    def _lookup(self, index, key):
+        if not self._ensure() and key not in index():
+            self.refresh()
+        return index().get(key)
+
+    def _one(self, name, objs):
+        if not objs:
+            raise ObjectNotFound(self.object_name, name)
+        elif len(objs)>1:
+            raise DuplicateObjectName(self.object_name, name, objs)
+        return objs[0]
+
+    def get_by_name(self, name):
+        return self._one(name, self._lookup(lambda: self.by_title, name))
+
+    def get_by_id(self, id):
+        obj=self._lookup(lambda: self.by_id, id)
+        if obj is None:
+            raise ObjectNotFound(self.object_name, id=id)
+        return obj
+
+    def get_many_by_name(self, names):
+        """Return the objects for all names, in the same order.
+
+        The index is refreshed at most once, for the first unknown name.
+        """
+        refreshed=self._ensure()
+        ret=[]
+        for name in names:
+            if name not in self.by_title and not refreshed:
+                self.refresh()
+                refreshed=True
+            ret.append(self._one(name, self.by_title.get(name)))
+        return ret
+
+
+def get_index(list_api, object_name, ttl=INDEX_TTL):
+    """Return the ObjectIndex of the resource list_api, it is created on first use."""
+    index=getattr(list_api, '_index', None)
+    if index is None:
+        with _index_lock:
+            index=getattr(list_api, '_index', None)
+            if index is None:
+                index=ObjectIndex(list_api, object_name, ttl)
+                list_api._index=index
+    return index
+
+
 def get_object_by_name(list_api, name, object_name):
-    sets=filter(
-        lambda inp: inp.title==name,
-        list_api.list())
-    if len(sets)==0:
-        raise ObjectNotFound(object_name, name)
-    else:
-        return sets[0]
+    return get_index(list_api, object_name).get_by_name(name)
+
+
+def get_many_by_name(list_api, names, object_name):
+    return get_index(list_api, object_name).get_many_by_name(names)
+
+
+def _api(api):
+    """The given API, or the default API of get_api()."""
+    return api if api is not None else get_api()
+
+
+def get_stream_by_name(name, api=None):
+    return get_object_by_name(_api(api).streams, name, "Stream")
+
+
+def get_streams_by_name(names, api=None):
+    return get_many_by_name(_api(api).streams, names, "Stream")
 
 
-def get_stream_by_name(name):
-    return get_object_by_name(get_api().streams, name, "Stream")
+def get_index_set_by_name(name, api=None):
+    return get_object_by_name(_api(api).index_sets, name, 'IndexSet')
 
 
-def get_index_set_by_name(name):
-    return get_object_by_name(get_api().index_sets, name, 'IndexSet')
+def get_index_sets_by_name(names, api=None):
+    return get_many_by_name(_api(api).index_sets, names, 'IndexSet')
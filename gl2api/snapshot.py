@@ -0,0 +1,143 @@
+"""Snapshot of the inputs, input types and extractors of a Graylog.
+
+The inputs and input types are fetched concurrently, followed by the extractor
+lists of all inputs, which are fetched on up to <concurrency> pooled
+connections. The snapshot indexes the extractors by input, ordered by their
+order, and can be stored on disk, so a later audit starts warm. refresh()
+updates it with one concurrent round of requests and returns the inputs, whose
+attributes or extractors changed:
+
+    snapshot=ExtractorSnapshot.load(path) if os.path.exists(path) else ExtractorSnapshot.take(api)
+    changed=snapshot.refresh(api)
+    for inp in snapshot.inputs.values():
+        print(inp.title, snapshot.input_type_of(inp.id), [e.title for e in snapshot.extractors_of(inp.id)])
+    snapshot.save(path)
+"""
+import os
+import pickle
+import time
+from multiprocessing.pool import ThreadPool
+
+from .bulk import run_bulk
+from .util import loggingFactory
+
+_getLogger=loggingFactory('snapshot')
+
+# stored with the snapshot, snapshots of other versions aren't loaded
+SNAPSHOT_VERSION=1
+
+
+def _state(obj):
+    """The public attributes of obj, for detecting changed inputs and extractors."""
+    return {k: v for (k, v) in vars(obj).items() if not k.startswith('_')}
+
+
+class ExtractorSnapshot(object):
+    """Inputs by id, input types by type name and the extractors of every input, ordered by order."""
+
+    def __init__(self, inputs=None, input_types=None, extractors=None):
+        self.inputs=inputs or {}
+        self.input_types=input_types or {}
+        self.extractors={}
+        self.taken_at=None
+        for (input_id, objs) in (extractors or {}).items():
+            self._set_extractors(input_id, objs)
+
+    def _set_extractors(self, input_id, objs):
+        self.extractors[input_id]=sorted(objs, key=lambda e: getattr(e, 'order', None))
+
+    def extractors_of(self, input_id):
+        return self.extractors.get(input_id, [])
+
+    def input_type_of(self, input_id):
+        """Return the InputType of the input, or None if the type is unknown."""
+        inp=self.inputs.get(input_id)
+        return self.input_types.get(inp.input_type) if inp is not None else None
+
+    def extractor(self, extractor_id):
+        """Return the (input, extractor) with the given extractor id, or None."""
+        for (input_id, objs) in self.extractors.items():
+            for e in objs:
+                if getattr(e, 'id', None)==extractor_id:
+                    return (self.inputs.get(input_id), e)
+        return None
+
+    @staticmethod
+    def _fetch_extractors(api, input_ids, concurrency):
+        """Return {input_id: extractors} of the inputs, inputs that fail are logged and left out."""
+        result=run_bulk(lambda input_id: api.extractors.list(input_id=input_id), list(input_ids),
+                        concurrency or api.pool_size)
+        for item in result.failed:
+            _getLogger('_fetch_extractors').error("Failed to list the extractors of input %s: %s", item.obj, item.error)
+        return {item.obj: item.result for item in result.succeeded}
+
+    @staticmethod
+    def _fetch_inputs(api):
+        """Fetch the input types and the inputs at the same time."""
+        pool=ThreadPool(2)
+        try:
+            types=pool.apply_async(api.input_types.list)
+            inputs=api.inputs.list()
+            return ({inp.id: inp for inp in inputs}, types.get())
+        finally:
+            pool.close()
+            pool.join()
+
+    @classmethod
+    def take(cls, api, concurrency=None):
+        """Fetch a new snapshot with the resources of api."""
+        (inputs, input_types)=cls._fetch_inputs(api)
+        ret=cls(inputs, input_types, cls._fetch_extractors(api, inputs.keys(), concurrency))
+        ret.taken_at=time.time()
+        return ret
+
+    def refresh(self, api, input_ids=None, concurrency=None):
+        """Update the snapshot and return the ids of the inputs, that were added, removed or changed.
+
+        The inputs and input types are listed again and the extractor lists of
+        all inputs are fetched concurrently, as adding or removing an extractor
+        doesn't change its input. With <input_ids> only the extractors of these
+        and of new or changed inputs are fetched. An input is changed if its attributes or
+        its extractors differ. Inputs, whose extractors can't be fetched, keep
+        their extractors.
+        """
+        (inputs, input_types)=self._fetch_inputs(api)
+        changed=set(input_id for (input_id, inp) in inputs.items()
+                    if input_id not in self.inputs or _state(inp)!=_state(self.inputs[input_id]))
+        changed.update(set(self.inputs.keys())-set(inputs.keys()))
+        if input_ids is None:
+            fetch=set(inputs.keys())
+        else:
+            fetch=set(input_id for input_id in input_ids if input_id in inputs)|(changed & set(inputs.keys()))
+
+        for (input_id, objs) in self._fetch_extractors(api, fetch, concurrency).items():
+            old=self.extractors.get(input_id)
+            self._set_extractors(input_id, objs)
+            if old is None or [_state(e) for e in old]!=[_state(e) for e in self.extractors[input_id]]:
+                changed.add(input_id)
+        for input_id in set(self.extractors.keys())-set(inputs.keys()):
+            del self.extractors[input_id]
+        self.inputs=inputs
+        self.input_types=input_types
+        self.taken_at=time.time()
+        return changed
+
+    def save(self, path):
+        """Store the snapshot in <path>, the file is replaced atomically."""
+        tmp="{}.{}.tmp".format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            pickle.dump((SNAPSHOT_VERSION, self), f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a snapshot stored with save()."""
+        with open(path, 'rb') as f:
+            (version, ret)=pickle.load(f)
+        if version!=SNAPSHOT_VERSION:
+            raise ValueError("Snapshot version {} isn't supported".format(version))
+        return ret
+
+    def __repr__(self):
+        return "ExtractorSnapshot(inputs={}, extractors={})".format(
+            len(self.inputs), sum(len(objs) for objs in self.extractors.values()))
@@ -0,0 +1,358 @@
+"""Converge the Graylog configuration to a desired state.
+
+The desired state is a dictionary of resource name to a list of objects, each
+given as dictionary of schema attribute names. The sync engine fetches the
+current objects of every resource once, matches them with the desired ones by
+their key and computes the field level differences. Only the fields given in
+the desired objects are compared, so the spec can be as small as needed. Key
+attributes left out of a spec take the default of the schema field, like
+inverted=False of stream rules.
+
+    desired={
+        "index_sets": [{"title": "App logs", "index_prefix": "app", "shards": 4, ...}],
+        "streams": [{"title": "App", "index_set": "App logs", "matching_type": "AND", ...}],
+        "stream_rules": [{"stream": "App", "field": "application", "_type": 1, "value": "app"}],
+    }
+    engine=SyncEngine(api)
+    plan=engine.plan(desired)
+    print(plan.format())
+    report=engine.apply(plan)
+
+References to other objects are given by their key, like the index set title
+of a stream, and resolved to ids when the changes are applied. Resources are
+created and updated in dependency order and deleted in reverse order; the
+objects of one resource are written concurrently with the bulk methods.
+Objects missing from the spec are only deleted for resources with prune=True.
+"""
+import json
+from multiprocessing.pool import ThreadPool
+
+from marshmallow import missing
+
+from .util import loggingFactory
+
+try:
+    import yaml
+except ImportError:     # pragma: no cover
+    yaml=None
+
+_getLogger=loggingFactory('sync')
+
+
+def _protected(obj):
+    """Default objects and read only roles are never deleted."""
+    return bool(getattr(obj, 'is_default', False) or getattr(obj, 'default', False) or
+                getattr(obj, 'read_only', False))
+
+
+class ResourceSync(object):
+    """Describes how the objects of a resource are matched and referenced.
+
+    <key> is the attribute, or tuple of attributes, that identifies an object.
+    Child resources name their <parent> as (parent resource, id attribute,
+    spec attribute), e.g. ('streams', 'stream_id', 'stream') for stream rules,
+    which reference their stream by title in the 'stream' attribute of the spec.
+    <refs> maps id attributes to (resource, spec attribute) in the same way.
+    """
+
+    def __init__(self, resource, key='title', parent=None, refs=None, prune=False, protect=_protected):
+        self.resource=resource
+        self.key=key
+        self.parent=parent
+        self.refs=dict(refs or {})
+        self.prune=prune
+        self.protect=protect
+
+    def spec_only(self):
+        """Attributes of the spec, that are references and not object attributes."""
+        ret=set(spec for (resource, spec) in self.refs.values())
+        if self.parent is not None:
+            ret.add(self.parent[2])
+        return ret
+
+    def key_of(self, obj, defaults=None):
+        """Return the key of a fetched object, or of a spec with <defaults> for the attributes it leaves out."""
+        if isinstance(obj, dict):
+            defaults=defaults or {}
+            get=lambda k: obj[k] if k in obj else defaults.get(k)
+        else:
+            get=lambda k: getattr(obj, k, None)
+        if isinstance(self.key, tuple):
+            return tuple(get(k) for k in self.key)
+        return get(self.key)
+
+    def __repr__(self):
+        return "ResourceSync(resource={}, key={})".format(self.resource, self.key)
+
+
+DEFAULT_RESOURCES=(
+    ResourceSync('index_sets'),
+    ResourceSync('inputs'),
+    ResourceSync('extractors', parent=('inputs', 'input_id', 'input')),
+    ResourceSync('roles', key='name'),
+    ResourceSync('streams', refs={'index_set_id': ('index_sets', 'index_set')}),
+    ResourceSync('stream_rules', key=('field', '_type', 'value', 'inverted'),
+                 parent=('streams', 'stream_id', 'stream')),
+)
+
+
+class Pending(object):
+    """Reference to an object, that doesn't exist yet."""
+
+    def __init__(self, resource, key):
+        self.resource=resource
+        self.key=key
+
+    def __repr__(self):
+        return "<{} {!r}>".format(self.resource, self.key)
+
+
+class Change(object):
+    """A create, update or delete of one object."""
+
+    CREATE, UPDATE, DELETE='create', 'update', 'delete'
+
+    def __init__(self, action, resource, key, obj=None, desired=None, diff=None):
+        self.action=action
+        self.resource=resource
+        self.key=key
+        self.obj=obj
+        self.desired=desired
+        self.diff=diff or {}
+
+    def format(self):
+        sign={self.CREATE: '+', self.UPDATE: '~', self.DELETE: '-'}[self.action]
+        ret="{} {} {}".format(sign, self.resource, self.key)
+        for (field, (old, new)) in sorted(self.diff.items()):
+            ret+="\n      {}: {!r} -> {!r}".format(field, old, new)
+        return ret
+
+    def __repr__(self):
+        return "Change(action={}, resource={}, key={})".format(self.action, self.resource, self.key)
+
+
+class SyncPlan(object):
+    """The changes to converge to the desired state, together with the fetched state."""
+
+    def __init__(self, changes, state):
+        self.changes=changes
+        self.state=state
+
+    def of(self, resource, action):
+        return [c for c in self.changes if c.resource==resource and c.action==action]
+
+    def is_empty(self):
+        return len(self.changes)==0
+
+    def summary(self):
+        ret={}
+        for c in self.changes:
+            ret.setdefault(c.resource, {Change.CREATE: 0, Change.UPDATE: 0, Change.DELETE: 0})[c.action]+=1
+        return ret
+
+    def format(self):
+        if not self.changes:
+            return "No changes"
+        return "\n".join(c.format() for c in self.changes)
+
+    def __len__(self):
+        return len(self.changes)
+
+
+class SyncReport(object):
+    """BulkResults of an applied plan by (resource, action)."""
+
+    def __init__(self, plan):
+        self.plan=plan
+        self.results={}
+
+    @property
+    def ok(self):
+        return all(r.ok for r in self.results.values())
+
+    @property
+    def failed(self):
+        return [item for r in self.results.values() for item in r.failed]
+
+    def __repr__(self):
+        return "SyncReport(changes={}, failed={})".format(len(self.plan), len(self.failed))
+
+
+class SyncEngine(object):
+
+    def __init__(self, api, resources=DEFAULT_RESOURCES, concurrency=None):
+        self.api=api
+        self.resources=list(resources)
+        self.concurrency=concurrency
+        self._by_name={rs.resource: rs for rs in self.resources}
+        self._defaults={}
+
+    def _needed(self, names):
+        """The requested resources and their parents and references, in dependency order."""
+        needed=set()
+        todo=list(names)
+        while todo:
+            name=todo.pop()
+            if name in needed:
+                continue
+            needed.add(name)
+            rs=self._by_name[name]
+            todo.extend(resource for (resource, spec) in rs.refs.values())
+            if rs.parent is not None:
+                todo.append(rs.parent[0])
+        return [rs for rs in self.resources if rs.resource in needed]
+
+    def fetch(self, names):
+        """Fetch the current objects of the resources, as {resource: {key: obj}}.
+
+        Children are keyed by (parent key, key) and listed concurrently for all parents,
+        their parent id attribute is set if the server leaves it out.
+        """
+        state={}
+        for rs in self._needed(names):
+            res=getattr(self.api, rs.resource)
+            if rs.parent is None:
+                state[rs.resource]={rs.key_of(obj): obj for obj in res.list()}
+                continue
+
+            (parent_resource, id_attr, spec)=rs.parent
+            parents=state[parent_resource].items()
+            pool=ThreadPool(max(1, min(len(parents), self.concurrency or self.api.pool_size)))
+            try:
+                listed=pool.map(lambda p: res.list(**{id_attr: p[1].id}), parents)
+            finally:
+                pool.close()
+                pool.join()
+            state[rs.resource]={}
+            for ((parent_key, parent), objs) in zip(parents, listed):
+                for obj in objs:
+                    # e.g. listed extractors don't contain the id of their input
+                    if getattr(obj, id_attr, None) is None:
+                        setattr(obj, id_attr, parent.id)
+                        if getattr(obj, '_tracked', False):
+                            obj.mark_clean()
+                    state[rs.resource][(parent_key, rs.key_of(obj))]=obj
+        return state
+
+    def _key_defaults(self, rs):
+        """The schema defaults of the key attributes, which the loaded objects get if the server omits them."""
+        if rs.resource not in self._defaults:
+            fields=getattr(self.api, rs.resource).schema().fields
+            names=rs.key if isinstance(rs.key, tuple) else (rs.key,)
+            defaults={}
+            for name in names:
+                default=fields[name].missing if name in fields else missing
+                if default is not missing:
+                    defaults[name]=default() if callable(default) else default
+            self._defaults[rs.resource]=defaults
+        return self._defaults[rs.resource]
+
+    def _full_key(self, rs, desired):
+        key=rs.key_of(desired, self._key_defaults(rs))
+        return (desired.get(rs.parent[2]), key) if rs.parent is not None else key
+
+    def _resolve(self, rs, desired, state, pending=False):
+        """Return the attributes of the desired object with references resolved to ids.
+
+        Unresolvable references, e.g. to objects that are created by the same
+        plan, are returned as None, or as a Pending placeholder with <pending>.
+        """
+        ret={k: v for (k, v) in desired.items() if k not in rs.spec_only()}
+        links=dict(rs.refs)
+        if rs.parent is not None:
+            links[rs.parent[1]]=(rs.parent[0], rs.parent[2])
+        for (attr, (resource, spec)) in links.items():
+            if spec in desired:
+                target=state.get(resource, {}).get(desired[spec])
+                if target is not None:
+                    ret[attr]=target.id
+                else:
+                    ret[attr]=Pending(resource, desired[spec]) if pending else None
+        return ret
+
+    def diff(self, rs, obj, desired, state):
+        """Return {field: (current, desired)} for all fields of desired that differ."""
+        ret={}
+        for (k, v) in self._resolve(rs, desired, state, pending=True).items():
+            current=getattr(obj, k, None)
+            if current!=v:
+                ret[k]=(current, v)
+        return ret
+
+    def plan(self, desired):
+        """Compute the SyncPlan to converge to the <desired> state."""
+        unknown=set(desired.keys())-set(self._by_name.keys())
+        if unknown:
+            raise ValueError("Unknown resources: {}".format(", ".join(sorted(unknown))))
+
+        state=self.fetch(desired.keys())
+        changes=[]
+        for rs in self.resources:
+            if rs.resource not in desired:
+                continue
+            current=state[rs.resource]
+            seen=set()
+            for d in desired[rs.resource]:
+                key=self._full_key(rs, d)
+                seen.add(key)
+                obj=current.get(key)
+                if obj is None:
+                    changes.append(Change(Change.CREATE, rs.resource, key, desired=d))
+                else:
+                    diff=self.diff(rs, obj, d, state)
+                    if diff:
+                        changes.append(Change(Change.UPDATE, rs.resource, key, obj=obj, desired=d, diff=diff))
+            if rs.prune:
+                for (key, obj) in current.items():
+                    if key not in seen and not rs.protect(obj):
+                        changes.append(Change(Change.DELETE, rs.resource, key, obj=obj))
+        return SyncPlan(changes, state)
+
+    def apply(self, plan, dry_run=False):
+        """Apply the plan and return a SyncReport. With dry_run, nothing is written."""
+        report=SyncReport(plan)
+        if dry_run:
+            return report
+
+        state=plan.state
+        for rs in self.resources:
+            res=getattr(self.api, rs.resource, None)
+            creates=plan.of(rs.resource, Change.CREATE)
+            if creates:
+                schema=res.schema()
+                objs=[schema.make_obj(self._resolve(rs, c.desired, state)) for c in creates]
+                result=res.add_many(objs, concurrency=self.concurrency, refetch='local')
+                report.results[(rs.resource, Change.CREATE)]=result
+                # children and references of later resources have to find the new objects
+                for (c, item) in zip(creates, result):
+                    if item.ok:
+                        state[rs.resource][c.key]=item.result
+
+            updates=plan.of(rs.resource, Change.UPDATE)
+            if updates:
+                for c in updates:
+                    # references to objects created above are resolved by now
+                    c.obj.update(**{k: v for (k, v) in self._resolve(rs, c.desired, state).items()
+                                    if getattr(c.obj, k, None)!=v})
+                report.results[(rs.resource, Change.UPDATE)]=res.update_many(
+                    [c.obj for c in updates], concurrency=self.concurrency, refetch='local')
+
+        for rs in reversed(self.resources):
+            deletes=plan.of(rs.resource, Change.DELETE)
+            if deletes:
+                report.results[(rs.resource, Change.DELETE)]=getattr(self.api, rs.resource).delete_many(
+                    [c.obj for c in deletes], concurrency=self.concurrency)
+
+        for item in report.failed:
+            _getLogger('apply').error("Sync failed for %s: %s", item.obj, item.error)
+        return report
+
+
+def load_spec(path):
+    """Load a desired state from a JSON or, if PyYAML is installed, a YAML file."""
+    with open(path) as f:
+        if path.endswith(('.yml', '.yaml')):
+            if yaml is None:
+                raise ImportError("YAML specs require the PyYAML package")
+            return yaml.safe_load(f)
+        return json.load(f)
@@ -1,4 +1,6 @@
 import logging
+import zlib
+from datetime import datetime, timedelta
 
 
 def loggingFactory(module=None):
@@ -45,3 +47,57 @@ def dict_to_obj(d, name='new'):
             setattr(top, i, j)
 
     return top
+
+
+TIMESTAMP_FORMAT="%Y-%m-%dT%H:%M:%S.%fZ"
+# graylog timestamps have millisecond precision
+TIMESTAMP_RESOLUTION=timedelta(milliseconds=1)
+
+
+def parse_timestamp(value):
+    """Convert a graylog timestamp string into a datetime, datetimes are returned unchanged."""
+    if isinstance(value, datetime):
+        return value
+    for fmt in (TIMESTAMP_FORMAT, "%Y-%m-%dT%H:%M:%SZ", "%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise ValueError("Invalid timestamp: {}".format(value))
+
+
+def format_timestamp(value):
+    """Convert a datetime into the graylog timestamp format with millisecond precision."""
+    return value.strftime(TIMESTAMP_FORMAT)[:-4]+"Z"
+
+
+def time_slices(_from, to, size):
+    """Split the time range [_from, to] into consecutive slices of <size>.
+
+    size can be a timedelta or a number of seconds. The slices are returned as
+    list of (from, to) tuples of formatted timestamps. Graylog includes both
+    ends of an absolute range, so every slice ends one millisecond before the
+    next one starts and a message is only found in one slice.
+    """
+    if not isinstance(size, timedelta):
+        size=timedelta(seconds=size)
+    if size<TIMESTAMP_RESOLUTION:
+        raise ValueError("Invalid slice size: {}".format(size))
+
+    start, end=parse_timestamp(_from), parse_timestamp(to)
+    ret=[]
+    while start<=end:
+        stop=start+size
+        if stop>=end:
+            ret.append((format_timestamp(start), format_timestamp(end)))
+            break
+        ret.append((format_timestamp(start), format_timestamp(stop-TIMESTAMP_RESOLUTION)))
+        start=stop
+    return ret
+
+
+def gzip_bytes(data, level=6):
+    """Compress the byte string <data> into the gzip format."""
+    # wbits 16+MAX_WBITS writes the gzip header and trailer
+    compressor=zlib.compressobj(level, zlib.DEFLATED, 16+zlib.MAX_WBITS)
+    return compressor.compress(data)+compressor.flush()
@@ -10,4 +10,5 @@ setup(name='gl2api',
       packages=['gl2api'],
       zip_safe=False,
       install_requires=['requests>=2.18', 'marshmallow==2.15.3'],
+      extras_require={'streaming': ['ijson'], 'columnar': ['numpy'], 'yaml': ['PyYAML']},
       setup_requires=['requests>=2.18', 'marshmallow==2.15.3'])
@@ -0,0 +1,81 @@
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from benchmarks.fake_server import FakeGraylog
+from benchmarks.run import make_api
+from gl2api.cache import DiskCache, DISK_TTLS, server_version
+
+
+class DiskCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory=os.path.join(tempfile.mkdtemp(), 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.directory))
+
+    def cache(self, version='1.0', ttl=60):
+        return DiskCache(self.directory, version=version, ttl=ttl)
+
+    def test_entries_are_shared_between_processes(self):
+        self.cache().store('roles', 'roles?a=1', ['admin'], etag='"1"')
+        entry=self.cache().lookup('roles', 'roles?a=1')
+        self.assertEqual(entry.value, ['admin'])
+        self.assertEqual(entry.etag, '"1"')
+        self.assertTrue(entry.is_fresh())
+        self.assertIsNone(self.cache().lookup('roles', 'roles?a=2'))
+
+    def test_versions_are_separated(self):
+        self.cache('1.0').store('roles', 'roles', [1])
+        cache=self.cache('2.0')
+        self.assertIsNone(cache.lookup('roles', 'roles'))
+        cache.store('roles', 'roles', [2])
+        self.assertEqual(cache.purge(), 1)
+        self.assertEqual(os.listdir(self.directory), ['2.0'])
+        self.assertEqual(self.cache('2.0').lookup('roles', 'roles').value, [2])
+
+    def test_purge_and_invalidate(self):
+        cache=self.cache(ttl=-1)
+        cache.store('roles', 'roles', [1])
+        cache.ttls['streams']=60
+        cache.store('streams', 'streams', [2])
+        self.assertEqual(cache.purge(), 1)
+        self.assertEqual(len(cache), 1)
+        cache.invalidate('streams')
+        self.assertEqual(len(cache), 0)
+        self.assertIsNone(self.cache().lookup('streams', 'streams'))
+
+    def test_files_and_directories_are_private(self):
+        cache=self.cache()
+        cache.store('roles', 'roles', [1])
+        for path in [self.directory, cache.path]+cache._files():
+            self.assertEqual(os.stat(path).st_mode & 0o077, 0)
+
+    def test_files_writable_by_others_are_not_loaded(self):
+        cache=self.cache()
+        cache.store('roles', 'roles', [1])
+        os.chmod(cache._file('roles', 'roles'), 0o666)
+        self.assertIsNone(self.cache().lookup('roles', 'roles'))
+
+    def test_directories_writable_by_others_are_refused(self):
+        cache=self.cache()
+        os.chmod(cache.path, stat.S_IRWXU | stat.S_IRWXG | stat.S_IRWXO)
+        self.assertRaises(ValueError, self.cache)
+
+    def test_warm_start_skips_requests(self):
+        with FakeGraylog(inputs=0, streams=1, rules=0) as server:
+            for i in range(2):
+                api=make_api(server.url)
+                api.cache=DiskCache(self.directory, server_version(api), ttls=DISK_TTLS)
+                types=api.input_types.list()
+                api.close()
+                # changes on the server are only seen by the first, cold API
+                server.input_types={}
+            self.assertGreater(len(types), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+from benchmarks.fake_server import FakeGraylog
+from gl2api import create_api
+from gl2api.nodes import NodePool
+from gl2api.retry import RetryPolicy
+
+# nothing listens on port 1, connections are refused at once
+DEAD_URL="http://127.0.0.1:1/api"
+
+
+class NodePoolTest(unittest.TestCase):
+
+    def test_pick_avoids_excluded_node(self):
+        pool=NodePool(["http://a/api", "http://b/api"], strategy='least_latency')
+        (a, b)=pool.nodes
+        self.assertIs(pool.pick(), a)
+        self.assertIs(pool.pick(exclude=a), b)
+        # all other nodes are ejected
+        pool.failed(b)
+        pool.failed(b)
+        pool.failed(b)
+        self.assertIs(pool.pick(exclude=a), a)
+
+    def test_single_node_is_always_picked(self):
+        pool=NodePool("http://a/api")
+        self.assertIs(pool.pick(exclude=pool.nodes[0]), pool.nodes[0])
+
+
+class FailoverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server=FakeGraylog(streams=2, rules=1).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def check_failover(self, strategy):
+        api=create_api([DEAD_URL, self.server.url], strategy=strategy, retry=RetryPolicy(backoff=0.001))
+        try:
+            for i in range(10):
+                self.assertEqual(len(api.streams.list()), 2)
+            (dead, alive)=api.nodes.nodes
+            self.assertIsNotNone(dead.ejected_until)
+            self.assertEqual(alive.failures, 0)
+        finally:
+            api.close()
+
+    def test_least_latency_fails_over(self):
+        self.check_failover('least_latency')
+
+    def test_round_robin_fails_over(self):
+        self.check_failover('round_robin')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+import requests.exceptions
+
+from benchmarks.fake_server import FakeGraylog
+from benchmarks.run import make_api
+from gl2api import Extractor, StreamRule, RESOURCES
+from gl2api.base import API
+
+
+class RefetchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server=FakeGraylog(inputs=2, extractors=2, streams=2, rules=2).start()
+        self.api=make_api(self.server.url)
+        self.input_id=sorted(self.server.inputs.keys())[0]
+        self.stream_id=sorted(self.server.streams.keys())[0]
+
+    def tearDown(self):
+        self.api.close()
+        self.server.stop()
+
+    def extractor(self, title="New"):
+        return Extractor(title=title, extractor_type="regex", converter_def={}, order=10, cut_or_copy="copy",
+                         source_field="message", target_field="new", extractor_config={"regex_value": "(.*)"},
+                         condition_type="none", condition_value="")
+
+    def rule(self, value="new"):
+        return StreamRule(stream_id=self.stream_id, description="", field="source", _type=1, value=value,
+                          inverted=False)
+
+    def test_writes_refetch_with_compiled_plans(self):
+        api=API(self.server.url)
+        for (name, schema) in RESOURCES:
+            api.add_resource(name, schema)
+            res=getattr(api, name)
+            for fname in ('add', 'update'):
+                m=getattr(res, fname, None)
+                if m is not None and 'get_info' in m.keywords['method_info']:
+                    self.assertIn('plan', m.keywords['method_info']['get_info'], "{}.{}".format(name, fname))
+
+    def test_response_with_only_the_id(self):
+        saved=self.api.stream_rules.add(self.rule("v"), refetch='response')
+        self.assertEqual((saved.value, saved.field, saved.stream_id), ("v", "source", self.stream_id))
+        self.assertEqual(self.server.rules[self.stream_id][saved.id]['value'], "v")
+        self.assertFalse(saved.is_dirty())
+
+    def test_response_with_the_object(self):
+        index_set=self.api.index_sets.list()[0]
+        index_set.title="Changed"
+        saved=self.api.index_sets.update(index_set, refetch='response')
+        self.assertEqual(saved.title, "Changed")
+        self.assertEqual(saved.creation_date, index_set.creation_date)
+
+    def test_local_copy_has_the_path_arguments(self):
+        saved=self.api.extractors.add(self.extractor(), input_id=self.input_id, refetch='local')
+        self.assertEqual(saved.input_id, self.input_id)
+        self.assertIn(saved.id, self.server.extractors[self.input_id])
+        self.assertFalse(saved.is_dirty())
+
+    def test_deferred_extractors_are_refetched(self):
+        saved=[self.api.extractors.add(self.extractor("New {}".format(i)), input_id=self.input_id, refetch='defer')
+               for i in range(3)]
+        # changed on the server after the write
+        for obj in saved:
+            self.server.extractors[self.input_id][obj.id]['creator_user_id']="admin"
+        refreshed=self.api.refetch_deferred()
+        self.assertEqual(sorted(o.id for o in refreshed), sorted(o.id for o in saved))
+        self.assertEqual([o.creator_user_id for o in saved], ["admin"]*3)
+        self.assertEqual(self.api.refetch_deferred(), [])
+
+    def test_failed_groups_stay_queued(self):
+        rule=self.api.stream_rules.add(self.rule(), refetch='defer')
+        extractor=self.api.extractors.add(self.extractor(), input_id=self.input_id, refetch='defer')
+        get=self.api._get
+
+        def failing_get(Schema, method_info, *args, **kwargs):
+            if method_info['resource']=='extractors':
+                raise requests.exceptions.ConnectionError("down")
+            return get(Schema, method_info, *args, **kwargs)
+
+        self.server.rules[self.stream_id][rule.id]['description']="changed"
+        self.api._get=failing_get
+        self.assertRaises(requests.exceptions.ConnectionError, self.api.refetch_deferred)
+        # the other groups are refreshed
+        self.assertEqual(rule.description, "changed")
+        del self.api._get
+        self.assertEqual([o.id for o in self.api.refetch_deferred()], [extractor.id])
+
+
+if __name__ == '__main__':
+    unittest.main()
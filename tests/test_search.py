@@ -0,0 +1,119 @@
+import unittest
+from datetime import timedelta
+
+from benchmarks.fake_server import FakeGraylog
+from benchmarks.run import make_api
+from gl2api import Stream
+from gl2api.executor import SearchExecutor
+from gl2api.search import ObjectNotFound, get_stream_by_name, get_streams_by_name
+from gl2api.util import time_slices
+
+
+class TimeSlicesTest(unittest.TestCase):
+
+    def test_slices_end_before_the_next_one_starts(self):
+        self.assertEqual(time_slices('2018-07-01T00:00:00.000Z', '2018-07-01T06:00:00.000Z', timedelta(hours=2)), [
+            ('2018-07-01T00:00:00.000Z', '2018-07-01T01:59:59.999Z'),
+            ('2018-07-01T02:00:00.000Z', '2018-07-01T03:59:59.999Z'),
+            ('2018-07-01T04:00:00.000Z', '2018-07-01T06:00:00.000Z'),
+        ])
+
+    def test_last_slice_ends_at_to(self):
+        self.assertEqual(time_slices('2018-07-01T00:00:00.000Z', '2018-07-01T00:00:05.500Z', 2)[-1],
+                         ('2018-07-01T00:00:04.000Z', '2018-07-01T00:00:05.500Z'))
+        self.assertEqual(time_slices('2018-07-01T00:00:00.000Z', '2018-07-01T00:00:00.000Z', 2),
+                         [('2018-07-01T00:00:00.000Z', '2018-07-01T00:00:00.000Z')])
+
+    def test_invalid_size(self):
+        self.assertRaises(ValueError, time_slices, '2018-07-01T00:00:00.000Z', '2018-07-01T01:00:00.000Z', 0)
+
+
+class SearchServerTest(unittest.TestCase):
+
+    def setUp(self):
+        # one message every 86.4 seconds, some at the slice boundaries
+        self.server=FakeGraylog(inputs=0, streams=0, search_total=1000).start()
+        self.api=make_api(self.server.url)
+
+    def tearDown(self):
+        self.api.close()
+        self.server.stop()
+
+
+class IterateTest(SearchServerTest):
+
+    def test_sliced_iteration_has_no_duplicates(self):
+        params={'query': '*', 'from': '2018-07-01T00:00:00.000Z', 'to': '2018-07-01T23:59:59.999Z'}
+        ids=[msg.message._id for msg in self.api.absolute_search.iterate(
+            query_params=params, page_size=100, slice_size=timedelta(minutes=36))]
+        self.assertEqual(len(ids), 1000)
+        self.assertEqual(len(set(ids)), 1000)
+
+
+class SearchExecutorTest(SearchServerTest):
+
+    PARAMS={'query': '*', 'from': '2018-07-01T00:00:00.000Z', 'to': '2018-07-01T23:59:59.999Z'}
+
+    def check(self, executor):
+        results=executor.search(self.PARAMS)
+        ids=[msg.message._id for msg in results]
+        self.assertEqual(len(set(ids)), 1000)
+        self.assertEqual(len(ids), 1000)
+        self.assertEqual(results.total_results, 1000)
+        self.assertEqual(ids, sorted(ids, reverse=executor.descending))
+        return results
+
+    def test_slices_are_not_counted_twice(self):
+        executor=SearchExecutor(self.api, slice_size=timedelta(minutes=36), page_size=50, concurrency=4)
+        self.assertEqual(len(self.check(executor).slices), 40)
+        self.assertEqual(executor.count(self.PARAMS), 1000)
+
+    def test_split_slices_descending(self):
+        executor=SearchExecutor(self.api, slice_size=timedelta(hours=6), max_slice_results=100, page_size=50,
+                                concurrency=4, descending=True)
+        self.assertGreater(len(self.check(executor).slices), 4)
+
+
+class ObjectIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server=FakeGraylog(inputs=0, streams=3, rules=0).start()
+        self.api=make_api(self.server.url)
+        self.lists=0
+        list_=self.api.streams.list
+
+        def counting_list(*args, **kwargs):
+            self.lists+=1
+            return list_(*args, **kwargs)
+
+        self.api.streams.list=counting_list
+
+    def tearDown(self):
+        self.api.close()
+        self.server.stop()
+
+    def test_writes_invalidate_the_index(self):
+        stream=get_stream_by_name("Stream 1", api=self.api)
+        self.api.streams.delete(stream)
+        self.assertRaises(ObjectNotFound, get_stream_by_name, "Stream 1", api=self.api)
+        self.api.streams.add(Stream(title="New", description="", matching_type="AND", rules=[],
+                                    index_set_id=stream.index_set_id, remove_matches_from_default_stream=False))
+        self.assertEqual(get_stream_by_name("New", api=self.api).title, "New")
+
+    def test_many_names_refresh_once(self):
+        self.assertEqual([s.title for s in get_streams_by_name(["Stream 0", "Stream 2"], api=self.api)],
+                         ["Stream 0", "Stream 2"])
+        self.assertEqual(self.lists, 1)
+        # created elsewhere, the index isn't invalidated
+        for title in ("A", "B"):
+            self.server.streams[title]=dict(self.server.streams.values()[0], id=title, title=title)
+        self.assertEqual([s.title for s in get_streams_by_name(["A", "Stream 0", "B"], api=self.api)],
+                         ["A", "Stream 0", "B"])
+        self.assertEqual(self.lists, 2)
+        self.server.streams["C"]=dict(self.server.streams["A"], id="C", title="C")
+        self.assertRaises(ObjectNotFound, get_streams_by_name, ["C", "Unknown"], api=self.api)
+        self.assertEqual(self.lists, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmarks.fake_server import FakeGraylog
+from benchmarks.run import make_api
+from gl2api.snapshot import ExtractorSnapshot
+
+
+class ExtractorSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server=FakeGraylog(inputs=3, extractors=3).start()
+        self.api=make_api(self.server.url)
+        self.snapshot=ExtractorSnapshot.take(self.api, concurrency=2)
+        self.input_id=sorted(self.server.inputs.keys())[0]
+
+    def tearDown(self):
+        self.api.close()
+        self.server.stop()
+
+    def test_take(self):
+        self.assertEqual(len(self.snapshot.inputs), 3)
+        orders=[e.order for e in self.snapshot.extractors_of(self.input_id)]
+        self.assertEqual(orders, sorted(orders))
+        self.assertEqual(self.snapshot.input_type_of(self.input_id).system_type,
+                         self.server.inputs[self.input_id]['type'])
+
+    def test_refresh_without_changes(self):
+        self.assertEqual(self.snapshot.refresh(self.api), set())
+
+    def test_refresh_sees_extractor_changes(self):
+        extractors=self.server.extractors[self.input_id]
+        del extractors[sorted(extractors.keys())[0]]
+        other=sorted(self.server.inputs.keys())[1]
+        self.server.extractors[other].values()[0]['title']="Changed"
+        self.assertEqual(self.snapshot.refresh(self.api), set([self.input_id, other]))
+        self.assertEqual(len(self.snapshot.extractors_of(self.input_id)), 2)
+        self.assertIn("Changed", [e.title for e in self.snapshot.extractors_of(other)])
+
+    def test_refresh_removed_and_changed_inputs(self):
+        (first, second, third)=sorted(self.server.inputs.keys())
+        del self.server.inputs[first]
+        self.server.inputs[second]['title']="Changed"
+        self.assertEqual(self.snapshot.refresh(self.api, input_ids=[]), set([first, second]))
+        self.assertNotIn(first, self.snapshot.extractors)
+        self.assertEqual(self.snapshot.inputs[second].title, "Changed")
+
+    def test_refresh_given_inputs(self):
+        (first, second, third)=sorted(self.server.inputs.keys())
+        for input_id in (first, second):
+            self.server.extractors[input_id].clear()
+        self.assertEqual(self.snapshot.refresh(self.api, input_ids=[first]), set([first]))
+        self.assertEqual(self.snapshot.extractors_of(first), [])
+        self.assertEqual(len(self.snapshot.extractors_of(second)), 3)
+
+    def test_save_and_load(self):
+        directory=tempfile.mkdtemp()
+        try:
+            path=os.path.join(directory, 'snapshot')
+            self.snapshot.save(path)
+            loaded=ExtractorSnapshot.load(path)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(sorted(loaded.inputs.keys()), sorted(self.snapshot.inputs.keys()))
+        self.assertEqual([e.id for e in loaded.extractors_of(self.input_id)],
+                         [e.id for e in self.snapshot.extractors_of(self.input_id)])
+        self.assertEqual(loaded.refresh(self.api), set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+from benchmarks.fake_server import FakeGraylog
+from gl2api import create_api
+from gl2api.sync import SyncEngine, ResourceSync
+
+
+class SyncTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server=FakeGraylog(inputs=2, extractors=2, streams=2, rules=2, index_sets=2).start()
+        self.api=create_api(self.server.url)
+        self.engine=SyncEngine(self.api, concurrency=2)
+
+    def tearDown(self):
+        self.api.close()
+        self.server.stop()
+
+    def converge(self, desired, runs=3):
+        """Apply the desired state <runs> times and return the plans."""
+        plans=[]
+        for i in range(runs):
+            plan=self.engine.plan(desired)
+            self.assertTrue(self.engine.apply(plan).ok)
+            plans.append(plan)
+        return plans
+
+    def test_stream_rule_without_defaults_is_created_once(self):
+        desired={"stream_rules": [{"stream": "Stream 0", "field": "application", "_type": 1, "value": "app"}]}
+        plans=self.converge(desired)
+        self.assertEqual(len(plans[0]), 1)
+        self.assertTrue(plans[1].is_empty(), plans[1].format())
+        rules=self.server.rules[sorted(self.server.rules.keys())[0]].values()
+        self.assertEqual(len([r for r in rules if r['field']=='application']), 1)
+
+    def test_update_changes_only_given_fields(self):
+        desired={"streams": [{"title": "Stream 1", "description": "Changed"}]}
+        plans=self.converge(desired)
+        self.assertEqual(plans[0].summary(), {'streams': {'create': 0, 'update': 1, 'delete': 0}})
+        self.assertTrue(plans[1].is_empty(), plans[1].format())
+        stream=[s for s in self.server.streams.values() if s['title']=="Stream 1"][0]
+        self.assertEqual(stream['description'], "Changed")
+        self.assertEqual(stream['matching_type'], "AND")
+
+    def test_unchanged_extractors_are_not_written(self):
+        input_id=sorted(self.server.inputs.keys())[0]
+        desired={"extractors": [{"input": "Input 0", "title": "Extractor 0", "target_field": "renamed"},
+                                {"input": "Input 0", "title": "Extractor 1"}]}
+        plans=self.converge(desired)
+        self.assertEqual(plans[0].summary(), {'extractors': {'create': 0, 'update': 1, 'delete': 0}})
+        self.assertTrue(plans[1].is_empty(), plans[1].format())
+        targets=sorted(e['target_field'] for e in self.server.extractors[input_id].values())
+        self.assertEqual(targets, ["field_1", "renamed"])
+
+    def test_prune_deletes_children(self):
+        input_id=sorted(self.server.inputs.keys())[0]
+        self.engine=SyncEngine(self.api, resources=[
+            ResourceSync('inputs'), ResourceSync('extractors', parent=('inputs', 'input_id', 'input'), prune=True)])
+        plans=self.converge({"extractors": [{"input": "Input 0", "title": "Extractor 0"}]}, runs=2)
+        self.assertEqual(len(plans[0].of('extractors', 'delete')), 3)
+        self.assertTrue(plans[1].is_empty(), plans[1].format())
+        self.assertEqual([e['title'] for e in self.server.extractors[input_id].values()], ["Extractor 0"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+
+from benchmarks.fake_server import FakeGraylog
+from benchmarks.run import make_api
+from gl2api import Input
+
+
+class TrackingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server=FakeGraylog(inputs=2, extractors=2, streams=2, rules=2).start()
+        self.api=make_api(self.server.url)
+
+    def tearDown(self):
+        self.api.close()
+        self.server.stop()
+
+    def test_loaded_objects_are_clean(self):
+        inp=self.api.inputs.list()[0]
+        self.assertFalse(inp.is_dirty())
+        inp.title="Changed"
+        self.assertEqual(inp.dirty_fields(), set(['title']))
+
+    def test_unchanged_update_is_skipped(self):
+        inp=self.api.inputs.list()[0]
+        self.server.inputs[inp.id]['title']="Changed on the server"
+        self.api.inputs.update(inp)
+        self.assertEqual(self.server.inputs[inp.id]['title'], "Changed on the server")
+
+    def test_nested_change_is_saved(self):
+        inp=self.api.inputs.list()[0]
+        inp.configuration['port']=99999
+        self.assertTrue(inp.is_field_dirty('configuration'))
+        saved=self.api.inputs.update(inp)
+        self.assertEqual(self.server.inputs[inp.id]['configuration']['port'], 99999)
+        self.assertFalse(saved.is_dirty())
+        self.assertFalse(inp.is_dirty())
+
+    def test_underscore_field_is_saved(self):
+        rule=self.api.stream_rules.list(stream_id=self.server.streams.keys()[0])[0]
+        rule._type=7
+        self.api.stream_rules.update(rule)
+        self.assertEqual(self.server.rules[rule.stream_id][rule.id]['type'], 7)
+
+    def test_partial_update_sends_nested_changes(self):
+        stream=self.api.streams.get(id=sorted(self.server.streams.keys())[0])
+        stream.alert_conditions.append({"id": "c1", "type": "message_count", "parameters": {}})
+        self.server.streams[stream.id]['title']="Changed on the server"
+        self.api.streams.update(stream)
+        saved=self.server.streams[stream.id]
+        self.assertEqual([c['id'] for c in saved['alert_conditions']], ["c1"])
+        # only the changed fields are sent
+        self.assertEqual(saved['title'], "Changed on the server")
+
+    def test_actions_on_unchanged_objects_are_sent(self):
+        index_set=[s for s in self.api.index_sets.list() if not s.default][0]
+        self.api.index_sets.set_default(index_set)
+        self.assertTrue(self.server.index_sets[index_set.id]['default'])
+
+    def test_changes_in_nested_rules_and_deleted_fields(self):
+        stream=self.api.streams.get(id=sorted(self.server.streams.keys())[0])
+        stream.rules[0]['value']="changed"
+        del stream.description
+        self.assertEqual(stream.dirty_fields(), set(['rules', 'description']))
+
+    def test_untracked_loads_are_always_saved(self):
+        inp=self.api.inputs.list(track=False)[0]
+        self.assertFalse(inp._tracked)
+        self.server.inputs[inp.id]['title']="Changed on the server"
+        self.api.inputs.update(inp)
+        self.assertEqual(self.server.inputs[inp.id]['title'], inp.title)
+
+    def test_new_objects_are_always_saved(self):
+        inp=self.api.inputs.list()[0]
+        copy=Input(**{k: v for (k, v) in vars(inp).items() if not k.startswith('_')})
+        copy.__dict__.pop('id')
+        self.assertFalse(copy._tracked)
+        self.api.inputs.add(copy)
+        self.assertEqual(len(self.server.inputs), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()